@@ -0,0 +1,107 @@
+import multiprocessing
+import time
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Optional
+
+import pandas as pd
+
+MANIFEST_COLUMNS = ["jsonld_path", "bids_dir", "output"]
+
+
+def read_manifest(manifest: Path) -> list:
+    """
+    Reads a batch manifest (.tsv) with one row per dataset to process, and returns a list
+    of dictionaries of the paths in each row.
+    """
+    manifest_df = pd.read_csv(
+        manifest, sep="\t", keep_default_na=False, dtype=str
+    )
+    missing_columns = set(MANIFEST_COLUMNS).difference(manifest_df.columns)
+    if missing_columns:
+        raise LookupError(
+            f"The provided batch manifest is missing the required column(s): {sorted(missing_columns)}. "
+            f"Make sure that the manifest is a .tsv file with the columns {MANIFEST_COLUMNS}."
+        )
+
+    return [
+        {column: Path(row[column]) for column in MANIFEST_COLUMNS}
+        for _, row in manifest_df.iterrows()
+    ]
+
+
+def _call_and_report(task: Callable, kwargs: dict, conn):
+    """Runs the task in a worker process and sends any error back to the parent process."""
+    try:
+        task(**kwargs)
+        conn.send(None)
+    except BaseException as err:
+        conn.send(f"{type(err).__name__}: {err}")
+    finally:
+        conn.close()
+
+
+def run_in_processes(
+    task: Callable,
+    entries: list,
+    jobs: int,
+    timeout: Optional[float] = None,
+) -> list:
+    """
+    Calls the task once per entry (a dictionary of keyword arguments), each in its own process,
+    with at most `jobs` processes running at the same time. Processes that take longer than
+    `timeout` seconds are terminated. Failures are isolated to their own entry.
+
+    Returns a report for each entry, in the order of the entries, with its status
+    ("success", "failed" or "timeout"), error message and duration in seconds.
+    """
+    pending = list(enumerate(entries))
+    running = {}
+    reports = [None] * len(entries)
+
+    while pending or running:
+        while pending and len(running) < jobs:
+            entry_idx, entry = pending.pop(0)
+            parent_conn, child_conn = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(
+                target=_call_and_report, args=(task, entry, child_conn)
+            )
+            process.start()
+            child_conn.close()
+            running[entry_idx] = (process, parent_conn, time.perf_counter())
+
+        wait(
+            [conn for _, conn, _ in running.values()]
+            + [process.sentinel for process, _, _ in running.values()],
+            timeout=0.1,
+        )
+
+        for entry_idx, (process, conn, start) in list(running.items()):
+            duration = time.perf_counter() - start
+            if conn.poll():
+                error = conn.recv()
+                status = "success" if error is None else "failed"
+            elif not process.is_alive():
+                error = f"The worker process exited unexpectedly with code {process.exitcode}."
+                status = "failed"
+            elif timeout is not None and duration > timeout:
+                process.terminate()
+                error = f"Processing did not finish within {timeout} seconds."
+                status = "timeout"
+            else:
+                continue
+
+            process.join()
+            conn.close()
+            del running[entry_idx]
+            reports[entry_idx] = {
+                **{
+                    key: str(value)
+                    for key, value in entries[entry_idx].items()
+                },
+                "status": status,
+                "error": error,
+                "duration_s": round(duration, 3),
+            }
+
+    return reports
@@ -0,0 +1,261 @@
+import json
+import math
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from functools import partial
+from pathlib import Path
+from typing import Callable
+
+import pandas as pd
+
+import bagel.bids_utils as butil
+import bagel.pheno_utils as putil
+from bagel import mappings, models
+from bagel.utility import load_json
+
+
+def generate_pheno_inputs(n_participants: int, output_dir: Path) -> tuple:
+    """
+    Writes a synthetic phenotypic .tsv file with two sessions per participant, and a matching
+    data dictionary, to the output directory. Returns the paths of both files.
+    """
+    pheno_df = pd.DataFrame(
+        {
+            "participant_id": [
+                f"sub-{idx:06d}"
+                for idx in range(n_participants)
+                for _ in range(2)
+            ],
+            "session_id": ["ses-01", "ses-02"] * n_participants,
+            "sex": ["M", "M", "F", "F"] * (n_participants // 2)
+            + ["M", "M"] * (n_participants % 2),
+            "age": [f"{20 + idx % 50}.5" for idx in range(2 * n_participants)],
+            "group": ["PAT", "CTRL"] * n_participants,
+            "tool_item1": [
+                "missing" if idx % 7 == 0 else str(idx % 10)
+                for idx in range(2 * n_participants)
+            ],
+            "tool_item2": [str(idx % 5) for idx in range(2 * n_participants)],
+        }
+    )
+
+    def about(term_url: str, **annotations) -> dict:
+        return {
+            "Description": term_url,
+            "Annotations": {
+                "IsAbout": {"TermURL": term_url, "Label": term_url},
+                **annotations,
+            },
+        }
+
+    data_dictionary = {
+        "participant_id": about(mappings.NEUROBAGEL["participant"]),
+        "session_id": about(mappings.NEUROBAGEL["session"]),
+        "sex": {
+            **about(
+                mappings.NEUROBAGEL["sex"],
+                Levels={
+                    "M": {"TermURL": "bids:Male", "Label": "Male"},
+                    "F": {"TermURL": "bids:Female", "Label": "Female"},
+                },
+            ),
+            "Levels": {"M": "Male", "F": "Female"},
+        },
+        "age": about(
+            mappings.NEUROBAGEL["age"],
+            Transformation={"TermURL": "bg:float", "Label": "float"},
+        ),
+        "group": {
+            **about(
+                mappings.NEUROBAGEL["diagnosis"],
+                Levels={
+                    "PAT": {"TermURL": "snomed:49049000", "Label": "PD"},
+                    "CTRL": {
+                        "TermURL": mappings.NEUROBAGEL["healthy_control"],
+                        "Label": "Healthy Control",
+                    },
+                },
+            ),
+            "Levels": {"PAT": "Patient", "CTRL": "Control"},
+        },
+        **{
+            column: about(
+                mappings.NEUROBAGEL["assessment_tool"],
+                IsPartOf={"TermURL": "cogAtlas:1234", "Label": "tool"},
+                MissingValues=["missing"] if column == "tool_item1" else [],
+            )
+            for column in ["tool_item1", "tool_item2"]
+        },
+    }
+
+    pheno_p = output_dir / "pheno.tsv"
+    dictionary_p = output_dir / "pheno.json"
+    pheno_df.to_csv(pheno_p, sep="\t", index=False)
+    with open(dictionary_p, "w") as f:
+        f.write(json.dumps(data_dictionary, indent=2))
+
+    return pheno_p, dictionary_p
+
+
+def generate_bids_tree(n_subjects: int, output_dir: Path) -> Path:
+    """
+    Writes a synthetic BIDS dataset with two sessions per subject and empty image files
+    (one T1w and three BOLD runs per session), each with a .json sidecar and BOLD runs with
+    an events file, to the output directory, and returns its path.
+    """
+    bids_dir = output_dir / "bids"
+    bids_dir.mkdir()
+    with open(bids_dir / "dataset_description.json", "w") as f:
+        f.write(json.dumps({"Name": "bench", "BIDSVersion": "1.8.0"}))
+
+    for idx in range(n_subjects):
+        for session in ["01", "02"]:
+            prefix = f"sub-{idx:06d}_ses-{session}"
+            session_dir = bids_dir / f"sub-{idx:06d}" / f"ses-{session}"
+            (session_dir / "anat").mkdir(parents=True)
+            (session_dir / "func").mkdir()
+            (session_dir / "anat" / f"{prefix}_T1w.nii.gz").touch()
+            (session_dir / "anat" / f"{prefix}_T1w.json").write_text(
+                json.dumps({"RepetitionTime": 2.3, "EchoTime": 0.003})
+            )
+            for run in range(1, 4):
+                run_prefix = (
+                    session_dir / "func" / f"{prefix}_task-rest_run-{run:02d}"
+                )
+                Path(f"{run_prefix}_bold.nii.gz").touch()
+                Path(f"{run_prefix}_bold.json").write_text(
+                    json.dumps({"RepetitionTime": 2.0, "TaskName": "rest"})
+                )
+                Path(f"{run_prefix}_events.tsv").write_text(
+                    "onset\tduration\n0\t10\n"
+                )
+
+    return bids_dir
+
+
+def time_scenario(func: Callable, repeats: int) -> dict:
+    """
+    Calls the function `repeats` times and returns the median and 95th percentile (nearest rank)
+    of its run times in seconds, and its peak traced memory use in MB, measured in an extra call
+    so that tracing does not affect the run times.
+    """
+    run_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        run_times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    run_times.sort()
+    return {
+        "median_s": round(statistics.median(run_times), 6),
+        "p95_s": round(run_times[math.ceil(0.95 * len(run_times)) - 1], 6),
+        "peak_memory_mb": round(peak_memory / 2**20, 3),
+        "repeats": repeats,
+    }
+
+
+def run_benchmarks(sizes: list, bids_sizes: list, repeats: int) -> dict:
+    """
+    Runs the benchmark scenarios on generated inputs and returns their results:
+    the pheno command (read, validate, build and serialize), validation only, and serialization
+    only, for phenotypic files with each number of participants in `sizes`, and for BIDS datasets
+    with each number of subjects in `bids_sizes`, adding BIDS sessions to a dataset and indexing
+    the dataset with the full and the minimal pybids configuration.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            size_dir = Path(tmp_dir) / f"pheno_{size}"
+            size_dir.mkdir()
+            pheno_p, dictionary_p = generate_pheno_inputs(size, size_dir)
+            data_dictionary = load_json(dictionary_p)
+            pheno_df = pd.read_csv(
+                pheno_p, sep="\t", keep_default_na=False, dtype=str
+            )
+            dataset = putil.create_dataset(data_dictionary, pheno_df, "bench")
+
+            results[f"pheno_{size}"] = time_scenario(
+                lambda: json.dumps(
+                    models.model_to_dict(
+                        putil.load_pheno_dataset(
+                            [pheno_p], [dictionary_p], "bench"
+                        )
+                    )
+                ),
+                repeats,
+            )
+            results[f"validate_{size}"] = time_scenario(
+                lambda: list(
+                    putil.find_input_problems(data_dictionary, pheno_df)
+                ),
+                repeats,
+            )
+            results[f"serialize_{size}"] = time_scenario(
+                lambda: json.dumps(models.model_to_dict(dataset)),
+                repeats,
+            )
+
+        for size in bids_sizes:
+            size_dir = Path(tmp_dir) / f"bids_{size}"
+            size_dir.mkdir()
+            bids_dir = generate_bids_tree(size, size_dir)
+            pheno_jsonld = models.model_to_dict(
+                models.Dataset(
+                    label="bench",
+                    hasSamples=[
+                        models.Subject(label=f"sub-{idx:06d}")
+                        for idx in range(size)
+                    ],
+                )
+            )
+
+            results[f"bids_{size}"] = time_scenario(
+                lambda: butil.add_bids_to_dataset(
+                    models.Dataset.parse_obj(pheno_jsonld), bids_dir
+                ),
+                repeats,
+            )
+            for index_type in ["full", "minimal"]:
+                results[f"bids_index_{index_type}_{size}"] = time_scenario(
+                    partial(
+                        butil.create_layout,
+                        bids_dir,
+                        validate=True,
+                        minimal_index=index_type == "minimal",
+                    ),
+                    repeats,
+                )
+
+    return {
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": results,
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> dict:
+    """
+    Compares the median run time of each scenario to a baseline, and returns the scenarios
+    that got slower by more than the threshold (a fraction of the baseline median),
+    with the relative change of their median run time.
+    """
+    regressions = {}
+    for name, scenario in results["scenarios"].items():
+        baseline_scenario = baseline["scenarios"].get(name)
+        if baseline_scenario is None or baseline_scenario["median_s"] <= 0:
+            continue
+        change = scenario["median_s"] / baseline_scenario["median_s"] - 1
+        if change > threshold:
+            regressions[name] = round(change, 3)
+
+    return regressions
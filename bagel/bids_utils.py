@@ -1,9 +1,39 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+from collections import defaultdict
 from pathlib import Path
 from typing import Optional
 
-from bids import BIDSLayout
+import bids
+from bids import BIDSLayout, BIDSLayoutIndexer
 
+import bagel.metrics_utils as mutil
 from bagel import mappings, models
+from bagel.utility import get_bagel_version, load_json
+
+# The only BIDS entities that bagel queries
+MINIMAL_INDEX_ENTITIES = [
+    "subject",
+    "session",
+    "datatype",
+    "suffix",
+    "extension",
+]
+# The BIDS sidecar metadata added to Acquisition objects, and the corresponding Acquisition fields
+ACQUISITION_METADATA_FIELDS = {
+    "RepetitionTime": "repetitionTime",
+    "EchoTime": "echoTime",
+    "MagneticFieldStrength": "magneticFieldStrength",
+}
+# Skip everything except NIfTI images, i.e. any file whose extension is not .nii or .nii.gz,
+# along with the directories pybids ignores by default and derivatives
+MINIMAL_INDEX_IGNORE = [
+    re.compile(r"^/(code|models|sourcedata|stimuli|derivatives)"),
+    re.compile(r"/[^/.]*\.(?!nii(?:\.gz)?$)[^/]*$"),
+]
 
 
 def map_term_to_namespace(term: str, namespace: dict) -> str:
@@ -22,13 +52,241 @@ def check_unique_bids_subjects(pheno_subjects: list, bids_subjects: list):
         )
 
 
+def fingerprint_bids_dir(bids_dir: Path) -> str:
+    """
+    Returns a hash of the relative path, size and modification time of every file in the
+    BIDS directory, along with the installed pybids version. Symlinks are not followed and
+    hidden directories (e.g. .git, .datalad) are skipped.
+    """
+    hasher = hashlib.sha256(f"pybids {bids.__version__}\n".encode())
+    for dirpath, dirnames, filenames in os.walk(bids_dir):
+        dirnames[:] = sorted(
+            dirname for dirname in dirnames if not dirname.startswith(".")
+        )
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            file_stat = os.lstat(file_path)
+            hasher.update(
+                f"{os.path.relpath(file_path, bids_dir)}\t"
+                f"{file_stat.st_size}\t{file_stat.st_mtime_ns}\n".encode()
+            )
+
+    return hasher.hexdigest()
+
+
+def get_minimal_index_config() -> dict:
+    """Returns the pybids BIDS configuration restricted to the entities in MINIMAL_INDEX_ENTITIES."""
+    bids_config = load_json(bids.config.get_option("config_paths")["bids"])
+    return {
+        "name": "bagel",
+        "entities": [
+            entity
+            for entity in bids_config["entities"]
+            if entity["name"] in MINIMAL_INDEX_ENTITIES
+        ],
+    }
+
+
+def create_layout(
+    bids_dir: Path,
+    validate: bool = True,
+    minimal_index: bool = True,
+    database_path: Optional[Path] = None,
+) -> BIDSLayout:
+    """
+    Indexes the BIDS directory. If minimal_index is True, only NIfTI image files are indexed,
+    for only the entities bagel uses, and sidecar metadata is not indexed at all.
+    If a database path is provided, the index is saved to it, or loaded from it if it already exists.
+    """
+    if not minimal_index:
+        return BIDSLayout(
+            bids_dir, validate=validate, database_path=database_path
+        )
+
+    return BIDSLayout(
+        bids_dir,
+        validate=validate,
+        database_path=database_path,
+        config=[get_minimal_index_config()],
+        indexer=BIDSLayoutIndexer(
+            validate=validate,
+            ignore=MINIMAL_INDEX_IGNORE,
+            index_metadata=False,
+        ),
+    )
+
+
+def load_layout(
+    bids_dir: Path,
+    validate: bool = True,
+    validation_cache: Optional[Path] = None,
+    minimal_index: bool = True,
+    database_path: Optional[Path] = None,
+) -> BIDSLayout:
+    """
+    Indexes the BIDS directory. If a validation cache file is provided, validation is skipped
+    for datasets whose fingerprint was recorded in the cache by an earlier successful validation,
+    and the fingerprint of newly validated datasets is added to the cache.
+    See create_layout() for the minimal_index and database_path options.
+    """
+    if not validate or validation_cache is None:
+        return create_layout(
+            bids_dir,
+            validate=validate,
+            minimal_index=minimal_index,
+            database_path=database_path,
+        )
+
+    fingerprint = fingerprint_bids_dir(bids_dir)
+    validated_datasets = (
+        load_json(validation_cache) if validation_cache.exists() else {}
+    )
+    if fingerprint in validated_datasets:
+        return create_layout(
+            bids_dir,
+            validate=False,
+            minimal_index=minimal_index,
+            database_path=database_path,
+        )
+
+    layout = create_layout(
+        bids_dir,
+        validate=True,
+        minimal_index=minimal_index,
+        database_path=database_path,
+    )
+    validated_datasets[fingerprint] = Path(bids_dir).absolute().as_posix()
+    with open(validation_cache, "w") as f:
+        f.write(json.dumps(validated_datasets, indent=2))
+
+    return layout
+
+
+def get_dataset_name(bids_dir: Path) -> str:
+    """Returns the Name in the dataset_description.json of the BIDS directory, or the directory name if there is none."""
+    description_p = Path(bids_dir) / "dataset_description.json"
+    description = load_json(description_p) if description_p.exists() else {}
+    return description.get("Name", Path(bids_dir).name)
+
+
+def _parse_bids_filename(filename: str) -> Optional[tuple]:
+    """
+    Returns the entities (as a frozenset of key-value pairs) and the suffix of a BIDS file name,
+    or None if the name is not made of key-value entities followed by a suffix.
+    """
+    *entity_parts, suffix = filename.split(".", 1)[0].split("_")
+    entities = [part.split("-", 1) for part in entity_parts]
+    if any(len(entity) != 2 for entity in entities):
+        return None
+    return frozenset(tuple(entity) for entity in entities), suffix
+
+
+class SidecarMetadataResolver:
+    """
+    Resolves the metadata of BIDS files from the JSON sidecars on disk, following the BIDS inheritance
+    principle: the sidecars that apply to a file are those with the same suffix and a subset of its entities
+    in the directory of the file and in each parent directory up to the dataset root, and values from
+    sidecars closer to the file take precedence.
+
+    Unlike BIDSLayout.get_metadata(), this does not need the sidecars to be indexed (see create_layout()),
+    and does not resolve the inheritance chain of each file from scratch: each directory is listed once,
+    each sidecar is parsed once, and the merged metadata of each chain of sidecars is memoized level by
+    level, so it is shared by all files with the same chain (e.g. all runs of a task).
+    """
+
+    def __init__(self, bids_dir: Path):
+        self.bids_dir = Path(bids_dir).absolute()
+        self._dir_sidecars = {}
+        self._sidecar_metadata = {}
+        self._merged_metadata = {(): {}}
+
+    def _get_dir_sidecars(self, directory: Path) -> list:
+        if directory not in self._dir_sidecars:
+            sidecars = []
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    parsed_name = _parse_bids_filename(entry.name)
+                    if parsed_name is not None:
+                        sidecars.append((*parsed_name, Path(entry.path)))
+            # Sidecars with fewer entities are applied first, so that the more specific ones take precedence
+            sidecars.sort(key=lambda sidecar: (len(sidecar[0]), sidecar[2]))
+            self._dir_sidecars[directory] = sidecars
+
+        return self._dir_sidecars[directory]
+
+    def _merge_chain(self, chain: tuple) -> dict:
+        if chain not in self._merged_metadata:
+            sidecar_p = chain[-1]
+            if sidecar_p not in self._sidecar_metadata:
+                self._sidecar_metadata[sidecar_p] = load_json(sidecar_p)
+            self._merged_metadata[chain] = {
+                **self._merge_chain(chain[:-1]),
+                **self._sidecar_metadata[sidecar_p],
+            }
+
+        return self._merged_metadata[chain]
+
+    def get_metadata(self, file_path: Path) -> dict:
+        """Returns the metadata of a BIDS file. The returned dict is shared and must not be modified."""
+        file_path = Path(file_path)
+        parsed_name = _parse_bids_filename(file_path.name)
+        if parsed_name is None:
+            return {}
+        entities, suffix = parsed_name
+
+        levels = []
+        directory = file_path.parent
+        while True:
+            sidecars = self._get_dir_sidecars(directory)
+            levels.append(
+                [
+                    sidecar_p
+                    for sidecar_entities, sidecar_suffix, sidecar_p in sidecars
+                    if sidecar_suffix == suffix
+                    and sidecar_entities <= entities
+                ]
+            )
+            if directory == self.bids_dir or directory == directory.parent:
+                break
+            directory = directory.parent
+
+        # The chain goes from the dataset root to the directory of the file
+        return self._merge_chain(
+            tuple(
+                sidecar_p for level in reversed(levels) for sidecar_p in level
+            )
+        )
+
+
+def get_acquisition_metadata(metadata: dict) -> dict:
+    """Returns the numeric values of the ACQUISITION_METADATA_FIELDS in the metadata of an image file, as Acquisition fields."""
+    return {
+        field: metadata[key]
+        for key, field in ACQUISITION_METADATA_FIELDS.items()
+        if isinstance(metadata.get(key), (int, float))
+        and not isinstance(metadata.get(key), bool)
+    }
+
+
 def create_acquisitions(
     layout: BIDSLayout,
     bids_sub_id: str,
     session: Optional[str],
+    aggregate: bool = False,
+    count_runs: bool = False,
+    metadata_resolver: Optional[SidecarMetadataResolver] = None,
 ) -> list:
-    """Parses BIDS image files for a specified session/subject to create a list of Acquisition objects."""
-    image_list = []
+    """
+    Parses BIDS image files for a specified session/subject to create a list of Acquisition objects.
+    If aggregate is True, a single Acquisition is created per contrast type instead of per image file,
+    which also records the number of image files of that contrast type if count_runs is True.
+    If a metadata resolver is provided, the ACQUISITION_METADATA_FIELDS of the image files are added
+    to the acquisitions. Aggregated acquisitions only get the values shared by all of their image files.
+    """
+    contrast_types = []
+    acquisition_metadata = []
     for bids_file in layout.get(
         subject=bids_sub_id,
         session=session,
@@ -40,13 +298,88 @@ def create_acquisitions(
             namespace=mappings.BIDS,
         )
         if mapped_term:
-            image_list.append(
-                models.Acquisition(
-                    hasContrastType=models.ControlledTerm(identifier=mapped_term, schemaKey="Image")
+            contrast_types.append(mapped_term)
+            acquisition_metadata.append(
+                {}
+                if metadata_resolver is None
+                else get_acquisition_metadata(
+                    metadata_resolver.get_metadata(bids_file.path)
                 )
             )
 
-    return image_list
+    if aggregate:
+        contrast_metadata = defaultdict(list)
+        for mapped_term, metadata in zip(contrast_types, acquisition_metadata):
+            contrast_metadata[mapped_term].append(metadata)
+
+        return [
+            models.Acquisition(
+                hasContrastType=models.get_controlled_term(
+                    identifier=mapped_term, schemaKey="Image"
+                ),
+                numberOfRuns=len(metadata_list) if count_runs else None,
+                **dict(
+                    set.intersection(
+                        *(set(metadata.items()) for metadata in metadata_list)
+                    )
+                ),
+            )
+            for mapped_term, metadata_list in contrast_metadata.items()
+        ]
+
+    return [
+        models.Acquisition(
+            hasContrastType=models.get_controlled_term(
+                identifier=mapped_term, schemaKey="Image"
+            ),
+            **metadata,
+        )
+        for mapped_term, metadata in zip(contrast_types, acquisition_metadata)
+    ]
+
+
+def _get_bids_root(bids_dir: Path, resolve_symlinks: bool = True) -> Path:
+    """Returns the absolute path of the BIDS directory, with its symlinks resolved if resolve_symlinks is True."""
+    return (
+        Path(bids_dir).resolve()
+        if resolve_symlinks
+        else Path(bids_dir).absolute()
+    )
+
+
+def index_session_paths(
+    layout: BIDSLayout,
+    bids_dir: Path,
+    resolve_symlinks: bool = True,
+) -> dict:
+    """
+    Maps every (subject, session) pair found in the BIDS dataset to the absolute path of its
+    directory on disk, using a single query of the layout. Subjects without a session layer
+    are stored with a session of None and map to the subject directory.
+
+    The dataset root is resolved only once and all other paths are derived from it, so that
+    symlinked files (e.g. in git-annex/DataLad datasets) are never stat-ed individually.
+    If resolve_symlinks is False, the root is made absolute without resolving any symlinks.
+    """
+    bids_root = _get_bids_root(bids_dir, resolve_symlinks=resolve_symlinks)
+    layout_root = Path(layout.root)
+
+    session_paths = {}
+    for file_path in layout.get(return_type="filename"):
+        path_parts = Path(file_path).relative_to(layout_root).parts
+        if not path_parts[0].startswith("sub-") or len(path_parts) < 2:
+            continue
+        session_dir = bids_root / path_parts[0]
+        session = None
+        if len(path_parts) > 2 and path_parts[1].startswith("ses-"):
+            session_dir = session_dir / path_parts[1]
+            session = path_parts[1].removeprefix("ses-")
+        session_paths.setdefault(
+            (path_parts[0].removeprefix("sub-"), session),
+            session_dir.as_posix(),
+        )
+
+    return session_paths
 
 
 def get_session_path(
@@ -54,28 +387,343 @@ def get_session_path(
     bids_dir: Path,
     bids_sub_id: str,
     session: Optional[str],
+    session_paths: Optional[dict] = None,
+    resolve_symlinks: bool = True,
 ) -> str:
-    """Returns session directory from the BIDS dataset if session layer exists, otherwise returns subject directory."""
-    if not session:
-        session_path = Path(
-            # TODO: Once bug in fetching subject directories with no session layers is resolved,
-            # switch to using layout.get() snippet below to fetch subject path.
-            bids_dir
+    """
+    Returns session directory from the BIDS dataset if session layer exists, otherwise returns subject directory.
+    The path is looked up in session_paths (see index_session_paths()) if given. Otherwise, or if no file was
+    indexed for the session, it is derived from the BIDS directory naming convention, in the same way as
+    index_session_paths() does.
+    """
+    session_path = (session_paths or {}).get((bids_sub_id, session))
+    if session_path is None:
+        session_path = (
+            _get_bids_root(bids_dir, resolve_symlinks=resolve_symlinks)
             / f"sub-{bids_sub_id}"
-            # layout.get(
-            #     subject=bids_sub_id,
-            #     target="subject",
-            #     return_type="dir",
-            # )[0]
-        )
-    else:
-        session_path = Path(
-            layout.get(
-                subject=bids_sub_id,
-                session=session,
-                target="session",
-                return_type="dir",
-            )[0]
-        )
-
-    return session_path.resolve().as_posix()
+        )
+        if session is not None:
+            session_path = session_path / f"ses-{session}"
+        session_path = session_path.as_posix()
+
+    return session_path
+
+
+def create_sessions(
+    layout: BIDSLayout,
+    bids_sub_id: str,
+    session_paths: dict,
+    aggregate_acquisitions: bool = False,
+    count_runs: bool = False,
+    metadata_resolver: Optional[SidecarMetadataResolver] = None,
+    resolve_symlinks: bool = True,
+) -> Optional[list]:
+    """
+    Creates a list of Session objects for the image files of a BIDS subject.
+    Returns None if the subject has no BIDS data at all.
+    resolve_symlinks should match the option that session_paths were indexed with (see get_session_path()).
+    See create_acquisitions() for the aggregate_acquisitions, count_runs and metadata_resolver options.
+    """
+    session_list = []
+
+    bids_sessions = layout.get_sessions(subject=bids_sub_id)
+    if not bids_sessions:
+        if not layout.get_datatypes(subject=bids_sub_id):
+            return None
+        bids_sessions = [None]
+
+    # For some reason .get_sessions() doesn't always follow alphanumeric order
+    # By default (without sorting) the session lists look like ["02", "01"] per subject
+    for session in sorted(bids_sessions):
+        image_list = create_acquisitions(
+            layout=layout,
+            bids_sub_id=bids_sub_id,
+            session=session,
+            aggregate=aggregate_acquisitions,
+            count_runs=count_runs,
+            metadata_resolver=metadata_resolver,
+        )
+
+        # If subject's session has no image files, a Session object is not added
+        if not image_list:
+            continue
+
+        # TODO: Currently if a subject has BIDS data but no "ses-" directories (e.g., only 1 session),
+        # we create a session for that subject with a custom label "ses-nb01" to be added to the graph
+        # so the API can still find the session-level information.
+        # This should be revisited in the future as for these cases the resulting dataset object is not
+        # an exact representation of what's on disk.
+        session_label = "nb01" if session is None else session
+        session_path = get_session_path(
+            layout=layout,
+            bids_dir=layout.root,
+            bids_sub_id=bids_sub_id,
+            session=session,
+            session_paths=session_paths,
+            resolve_symlinks=resolve_symlinks,
+        )
+
+        # TODO: needs refactoring once we also handle phenotypic information at the session level
+        session_list.append(
+            # Add back "ses" prefix because pybids stripped it
+            models.Session(
+                label="ses-" + session_label,
+                filePath=session_path,
+                hasAcquisition=image_list,
+            )
+        )
+
+    run_metrics = mutil.current_run()
+    run_metrics.add("sessions_found", len(session_list))
+    run_metrics.add(
+        "acquisitions_found",
+        sum(len(session.hasAcquisition) for session in session_list),
+    )
+    return session_list
+
+
+class SessionCheckpoint:
+    """
+    Records the progress of a run in a checkpoint directory, so that an interrupted run can be resumed
+    without indexing the BIDS directory or creating the sessions of the subjects it already processed again.
+    The directory contains the pybids database of the layout (see create_layout()), the Session lists
+    created for each subject, which are saved every `interval` subjects, and the BIDS directory fingerprint,
+    bagel version and options of the run, which must match for the checkpoint to be resumed.
+    """
+
+    def __init__(
+        self,
+        checkpoint_dir: Path,
+        bids_dir: Path,
+        options: dict,
+        resume: bool = False,
+        interval: int = 100,
+    ):
+        self.checkpoint_dir = Path(checkpoint_dir)
+        self.layout_database = self.checkpoint_dir / "layout.db"
+        self.interval = interval
+        self.run_info = {
+            "bagel_version": get_bagel_version(),
+            "bids_dir": Path(bids_dir).absolute().as_posix(),
+            "bids_fingerprint": fingerprint_bids_dir(bids_dir),
+            "options": options,
+        }
+        self._info_p = self.checkpoint_dir / "checkpoint.json"
+        self._sessions_p = self.checkpoint_dir / "sessions.jsonl"
+        self._pending_records = []
+
+        self.resumed = (
+            resume
+            and self._info_p.exists()
+            and load_json(self._info_p) == self.run_info
+        )
+        if self.resumed:
+            self.sessions = self._load_sessions()
+        else:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+            self.checkpoint_dir.mkdir()
+            self.sessions = {}
+
+    def _load_sessions(self) -> dict:
+        sessions = {}
+        if not self._sessions_p.exists():
+            return sessions
+
+        valid_size = 0
+        with open(self._sessions_p, "rb") as f:
+            for line in f:
+                # The last line may have been written only partially before the run stopped
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                sessions[record["subject"]] = (
+                    None
+                    if record["sessions"] is None
+                    else [
+                        models.Session.parse_obj(session)
+                        for session in record["sessions"]
+                    ]
+                )
+                valid_size += len(line)
+        # New records are appended after the last complete one
+        os.truncate(self._sessions_p, valid_size)
+
+        return sessions
+
+    def mark_layout_indexed(self):
+        """
+        Records the run info once the layout database is complete. A checkpoint without run info
+        is never resumed, since its layout database may be incomplete.
+        """
+        if not self._info_p.exists():
+            with open(self._info_p, "w") as f:
+                f.write(json.dumps(self.run_info, indent=2))
+
+    def create_sessions(
+        self, layout: BIDSLayout, bids_sub_id: str, **kwargs
+    ) -> Optional[list]:
+        """
+        Returns the recorded Session list of a subject processed before the run was interrupted,
+        or creates (see create_sessions()) and records the Session list of a new subject.
+        """
+        if bids_sub_id in self.sessions:
+            return self.sessions[bids_sub_id]
+
+        session_list = create_sessions(
+            layout=layout, bids_sub_id=bids_sub_id, **kwargs
+        )
+        self._pending_records.append(
+            {
+                "subject": bids_sub_id,
+                "sessions": None
+                if session_list is None
+                else [
+                    models.model_to_dict(session) for session in session_list
+                ],
+            }
+        )
+        if len(self._pending_records) >= self.interval:
+            self.save()
+
+        return session_list
+
+    def save(self):
+        """Appends the Session lists created since the last save to the checkpoint, and syncs it to disk."""
+        with open(self._sessions_p, "a") as f:
+            for record in self._pending_records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending_records = []
+
+    def remove(self):
+        """Removes the checkpoint directory, once the run has finished successfully."""
+        shutil.rmtree(self.checkpoint_dir)
+
+
+def add_sessions_to_dataset(
+    dataset: models.Dataset,
+    layout: BIDSLayout,
+    session_paths: dict,
+    aggregate_acquisitions: bool = False,
+    count_runs: bool = False,
+    checkpoint: Optional[SessionCheckpoint] = None,
+    metadata_resolver: Optional[SidecarMetadataResolver] = None,
+    resolve_symlinks: bool = True,
+) -> models.Dataset:
+    """
+    Adds the BIDS sessions of each subject in the layout to the matching phenotypic subject
+    of the dataset. Subjects are modified in place. If a checkpoint is provided, the sessions
+    are created and recorded through it (see SessionCheckpoint.create_sessions()).
+    See create_acquisitions() for the metadata_resolver option, and create_sessions() for resolve_symlinks.
+    """
+    pheno_subject_dict = {
+        pheno_subject.label: pheno_subject
+        for pheno_subject in dataset.hasSamples
+    }
+
+    create_subject_sessions = (
+        create_sessions if checkpoint is None else checkpoint.create_sessions
+    )
+
+    for bids_sub_id in layout.get_subjects():
+        session_list = create_subject_sessions(
+            layout=layout,
+            bids_sub_id=bids_sub_id,
+            session_paths=session_paths,
+            aggregate_acquisitions=aggregate_acquisitions,
+            count_runs=count_runs,
+            metadata_resolver=metadata_resolver,
+            resolve_symlinks=resolve_symlinks,
+        )
+        if session_list is not None:
+            pheno_subject_dict.get(
+                f"sub-{bids_sub_id}"
+            ).hasSession = session_list
+
+    return dataset
+
+
+def index_bids_dataset(
+    bids_dir: Path,
+    validate: bool = True,
+    validation_cache: Optional[Path] = None,
+    minimal_index: bool = True,
+    resolve_symlinks: bool = True,
+    checkpoint: Optional[SessionCheckpoint] = None,
+) -> tuple:
+    """
+    Indexes the BIDS directory (see load_layout()) and the paths of its sessions
+    (see index_session_paths()), and returns the layout and the session paths.
+    If a checkpoint is provided, the index is stored in, or reloaded from, the checkpoint.
+    """
+    run_metrics = mutil.current_run()
+    with run_metrics.stage("index"):
+        layout = load_layout(
+            bids_dir,
+            validate=validate,
+            validation_cache=validation_cache,
+            minimal_index=minimal_index,
+            database_path=None
+            if checkpoint is None
+            else checkpoint.layout_database,
+        )
+        session_paths = index_session_paths(
+            layout=layout,
+            bids_dir=bids_dir,
+            resolve_symlinks=resolve_symlinks,
+        )
+    if checkpoint is not None:
+        checkpoint.mark_layout_indexed()
+    run_metrics.add("bids_subjects", len(layout.get_subjects()))
+
+    return layout, session_paths
+
+
+def add_bids_to_dataset(
+    dataset: models.Dataset,
+    bids_dir: Path,
+    validate: bool = True,
+    validation_cache: Optional[Path] = None,
+    minimal_index: bool = True,
+    resolve_symlinks: bool = True,
+    aggregate_acquisitions: bool = False,
+    count_runs: bool = False,
+    acquisition_metadata: bool = False,
+    checkpoint: Optional[SessionCheckpoint] = None,
+) -> models.Dataset:
+    """
+    Indexes the BIDS directory (see index_bids_dataset()), checks that all of its subjects are in the
+    dataset, and adds their BIDS sessions to the matching phenotypic subjects (see add_sessions_to_dataset()).
+    If acquisition_metadata is True, the acquisitions get the metadata of the .json sidecars of their
+    image files (see SidecarMetadataResolver).
+    """
+    layout, session_paths = index_bids_dataset(
+        bids_dir,
+        validate=validate,
+        validation_cache=validation_cache,
+        minimal_index=minimal_index,
+        resolve_symlinks=resolve_symlinks,
+        checkpoint=checkpoint,
+    )
+    with mutil.current_run().stage("build"):
+        check_unique_bids_subjects(
+            pheno_subjects=[subject.label for subject in dataset.hasSamples],
+            bids_subjects=[
+                "sub-" + sub_id for sub_id in layout.get_subjects()
+            ],
+        )
+        add_sessions_to_dataset(
+            dataset=dataset,
+            layout=layout,
+            session_paths=session_paths,
+            aggregate_acquisitions=aggregate_acquisitions,
+            count_runs=count_runs,
+            checkpoint=checkpoint,
+            metadata_resolver=SidecarMetadataResolver(layout.root)
+            if acquisition_metadata
+            else None,
+            resolve_symlinks=resolve_symlinks,
+        )
+
+    return dataset
@@ -1,48 +1,429 @@
+import inspect
 import json
+import os
+import time
+from functools import partial, wraps
 from pathlib import Path
+from typing import Iterable, List, Optional
 
-import pandas as pd
 import typer
-from bids import BIDSLayout
 from pydantic import ValidationError
 
+import bagel.batch_utils as batch_utils
+import bagel.bench_utils as bench_utils
 import bagel.bids_utils as butil
+import bagel.metrics_utils as mutil
 import bagel.pheno_utils as putil
-from bagel import mappings, models
-from bagel.utility import load_json
+import bagel.rdf_utils as rutil
+import bagel.upload_utils as uutil
+from bagel import models
+from bagel.utility import (
+    Compression,
+    CSVEngine,
+    OutputFormat,
+    add_compression_suffix,
+    get_bagel_version,
+    hash_file,
+    iter_json_fields,
+    load_json,
+    open_file,
+    write_json_fields,
+    write_jsonld_shards,
+)
 
 bagel = typer.Typer()
 
 
+def _write_jsonld(
+    dataset_dict: dict,
+    output_p: Path,
+    compression: Compression,
+    context: Optional[dict] = None,
+    shards: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    jobs: int = 1,
+):
+    """
+    Writes a serialized Dataset, together with its @context, to a (compressed) .jsonld file,
+    or to several shard files if a number of shards or a shard size is given.
+    """
+    document = (
+        putil.generate_context()
+        if context is None
+        else putil.update_context(context)
+    )
+    # We can't just exclude_unset here because the identifier and schemaKey
+    # for each instance are created as default values and so technically are never set
+    # TODO: we should revisit this because there may be reasons to have None be meaningful in the future
+    document = {**document, **dataset_dict}
+
+    run_metrics = mutil.current_run()
+    if shards is not None or shard_size is not None:
+        manifest = write_jsonld_shards(
+            document,
+            output_p,
+            compression,
+            n_shards=shards,
+            shard_size=shard_size,
+            jobs=jobs,
+        )
+        if run_metrics.enabled:
+            for shard in manifest["shards"]:
+                run_metrics.add_file_size(
+                    "bytes_written", output_p.with_name(shard["path"])
+                )
+        return
+
+    jsonld_p = add_compression_suffix(output_p, compression)
+    with open_file(jsonld_p, "w", compression) as f:
+        f.write(json.dumps(document, indent=2))
+    run_metrics.add_file_size("bytes_written", jsonld_p)
+
+
+def _write_rdf(
+    dataset_dict: dict,
+    subjects: Iterable[dict],
+    output_p: Path,
+    output_format: OutputFormat,
+    compression: Compression,
+    context: Optional[dict] = None,
+):
+    """
+    Writes the fields of a serialized Dataset and its serialized subjects, which are consumed
+    one at a time, to a (compressed) N-Triples or N-Quads file.
+    """
+    rdf_p = add_compression_suffix(output_p, compression)
+    with open_file(rdf_p, "w", compression) as f:
+        rutil.RDFWriter(
+            f,
+            putil.generate_context()
+            if context is None
+            else putil.update_context(context),
+            named_graph=output_format == OutputFormat.nq,
+        ).write_dataset(dataset_dict, subjects)
+    mutil.current_run().add_file_size("bytes_written", rdf_p)
+
+
+def _write_summary(summary: dict, dataset_dict: dict, output_p: Path):
+    """Writes the summary statistics of a serialized Dataset to a .json file that references the dataset by its @id."""
+    with open(output_p, "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "dataset": dataset_dict["identifier"],
+                    "label": dataset_dict["label"],
+                    **summary,
+                },
+                indent=2,
+            )
+        )
+    mutil.current_run().add_file_size("bytes_written", output_p)
+
+
+def _check_shard_options(
+    shards: Optional[int],
+    shard_size: Optional[int],
+    output_format: OutputFormat,
+):
+    if (
+        shards is not None or shard_size is not None
+    ) and output_format != OutputFormat.jsonld:
+        raise typer.BadParameter(
+            "--shards and --shard-size can only be used with the jsonld output format."
+        )
+
+
+def _stat_files(directory: Path) -> dict:
+    """Returns the size and modification time of each file directly in a directory."""
+    return {
+        file_p.name: (file_p.stat().st_size, file_p.stat().st_mtime_ns)
+        for file_p in directory.iterdir()
+        if file_p.is_file()
+    }
+
+
+def _fingerprinted(
+    output_name: str, input_files: tuple, bids_dir: Optional[str] = None
+):
+    """
+    Makes a command record a fingerprint of each successful run in <output_name>.fingerprint.json
+    in its output directory, and exit early if skip_if_unchanged is True and the fingerprint of the
+    new run matches the recorded one. The fingerprint covers the content hashes of the input_files
+    parameters, the listing of the bids_dir parameter (see butil.fingerprint_bids_dir()), the bagel
+    version and all other parameters of the command apart from output, skip_if_unchanged, metrics_file,
+    csv_engine and the checkpoint options, which do not affect the outputs.
+
+    The fingerprint also records the content hashes of the files that the run created or modified in
+    the output directory, and a run is only skipped if these files are still there and unchanged.
+    """
+
+    def decorator(command):
+        @wraps(command)
+        def wrapper(*args, **kwargs):
+            arguments = inspect.signature(command).bind(*args, **kwargs)
+            arguments.apply_defaults()
+            arguments = arguments.arguments
+            options = {
+                name: value
+                for name, value in arguments.items()
+                if name
+                not in {
+                    "output",
+                    "skip_if_unchanged",
+                    "metrics_file",
+                    "csv_engine",
+                    "checkpoint",
+                    "checkpoint_interval",
+                    "resume",
+                    *input_files,
+                }
+            }
+            fingerprint = {
+                "command": command.__name__,
+                "bagel_version": get_bagel_version(),
+                "input_hashes": {
+                    name: (
+                        [hash_file(file_p) for file_p in arguments[name]]
+                        if isinstance(arguments[name], list)
+                        else hash_file(arguments[name])
+                    )
+                    for name in input_files
+                },
+                "bids_fingerprint": (
+                    butil.fingerprint_bids_dir(arguments[bids_dir])
+                    if bids_dir is not None
+                    else None
+                ),
+                # Round trip through JSON so that paths and enums compare equal to the recorded values
+                "options": json.loads(json.dumps(options, default=str)),
+            }
+
+            output_dir = Path(arguments["output"])
+            fingerprint_p = output_dir / f"{output_name}.fingerprint.json"
+            if fingerprint_p.exists():
+                recorded_fingerprint = load_json(fingerprint_p)
+                recorded_outputs = recorded_fingerprint.pop("outputs", None)
+                if (
+                    arguments["skip_if_unchanged"]
+                    and recorded_fingerprint == fingerprint
+                    and recorded_outputs is not None
+                    and all(
+                        (output_dir / name).is_file()
+                        and hash_file(output_dir / name) == output_hash
+                        for name, output_hash in recorded_outputs.items()
+                    )
+                ):
+                    print(
+                        "The inputs, options and outputs are unchanged since the run recorded in "
+                        f"{fingerprint_p}. Skipping."
+                    )
+                    return
+                # The outputs will no longer match the recorded fingerprint, even if the run fails
+                fingerprint_p.unlink()
+
+            files_before_run = _stat_files(output_dir)
+            command(*args, **kwargs)
+            fingerprint["outputs"] = {
+                name: hash_file(output_dir / name)
+                for name, file_stat in _stat_files(output_dir).items()
+                if files_before_run.get(name) != file_stat
+            }
+
+            with open(fingerprint_p, "w") as f:
+                f.write(json.dumps(fingerprint, indent=2))
+
+        return wrapper
+
+    return decorator
+
+
+def _recorded(dataset: Optional[str] = None):
+    """
+    Makes a command record metrics of its run (see metrics_utils.RunMetrics) and write them in the
+    OpenMetrics text format to the file given by its metrics_file parameter, also if the run fails.
+    The metrics are labelled with the command name and, if given, the value of the dataset parameter.
+    Nothing is recorded if metrics_file is None.
+    """
+
+    def decorator(command):
+        @wraps(command)
+        def wrapper(*args, **kwargs):
+            arguments = (
+                inspect.signature(command).bind(*args, **kwargs).arguments
+            )
+            metrics_file = arguments.get("metrics_file")
+            with mutil.recording_run(
+                command.__name__, enabled=metrics_file is not None
+            ) as run_metrics:
+                if metrics_file is None:
+                    return command(*args, **kwargs)
+
+                if dataset is not None:
+                    run_metrics.labels["dataset"] = arguments[dataset]
+                success = False
+                try:
+                    command(*args, **kwargs)
+                    success = True
+                finally:
+                    run_metrics.write(metrics_file, success=success)
+
+        return wrapper
+
+    return decorator
+
+
+# Help of the options shared by several commands
+PHENO_HELP = (
+    "The path to a phenotypic .tsv file. Repeat to combine several phenotypic files "
+    "(e.g. one per instrument), which are joined on their participant ID columns."
+)
+DICTIONARY_HELP = (
+    "The path to the .json data dictionary corresponding to the phenotypic .tsv file. "
+    "Repeat once per phenotypic file, in the same order."
+)
+BIDS_DIR_HELP = "The path to the corresponding BIDS dataset directory."
+OUTPUT_HELP = "The directory where outputs should be created."
+NAME_HELP = (
+    "A descriptive name for the dataset the input belongs to. This name is expected to match "
+    "the name field in the BIDS dataset_description.json file."
+)
+RESOLVE_SYMLINKS_HELP = (
+    "Whether to resolve symlinks in the session paths added to the output. Disable for "
+    "symlink-heavy (e.g. git-annex/DataLad) datasets to keep the paths as they appear in the BIDS directory."
+)
+VALIDATE_HELP = "Whether to validate the BIDS dataset before indexing it."
+VALIDATION_CACHE_HELP = (
+    "The path to a .json file in which to record datasets that passed BIDS validation. "
+    "Validation is skipped for a dataset whose files have not changed since it was recorded."
+)
+MINIMAL_INDEX_HELP = (
+    "Whether to index only the NIfTI image files of the BIDS dataset, without their sidecar "
+    "metadata. Disable to index the BIDS dataset with the full default pybids configuration."
+)
+AGGREGATE_ACQUISITIONS_HELP = (
+    "Whether to create a single acquisition per contrast type in each session, "
+    "instead of one acquisition per image file."
+)
+COUNT_RUNS_HELP = (
+    "Whether to record the number of image files of each contrast type in a session. "
+    "Only used together with --aggregate-acquisitions."
+)
+ACQUISITION_METADATA_HELP = (
+    "Whether to add the repetition time, echo time and magnetic field strength of each acquisition, "
+    "read from the .json sidecars of its image files following the BIDS inheritance principle. "
+    "With --aggregate-acquisitions, only values shared by all image files of a contrast type are added."
+)
+COMPRESSION_HELP = (
+    "The format with which to compress the output .jsonld file as it is written. "
+    "The file extension of the compression format is appended to the output file name."
+)
+SHARDS_HELP = (
+    "The number of files to split the output subjects into. Each file is a self-contained "
+    "JSON-LD document that references the dataset, and the files are listed in a manifest."
+)
+SHARD_SIZE_HELP = "The maximum number of subjects per output file, as an alternative to --shards."
+FORMAT_HELP = (
+    "The format of the output file. The nt (N-Triples) and nq (N-Quads, in a named graph "
+    "of the dataset) formats have one statement per line and can be loaded into a graph store "
+    "without JSON-LD processing."
+)
+SKIP_IF_UNCHANGED_HELP = (
+    "Whether to exit without doing anything if the inputs, options and bagel version are unchanged "
+    "since the last successful run with the same output directory, and the outputs of that run are still "
+    "there and unchanged. Every run records a fingerprint of these in {output_name}.fingerprint.json "
+    "in the output directory."
+)
+PHENO_BIDS_SUMMARY_HELP = (
+    "Whether to also write summary statistics of the subjects to pheno_bids_summary.json: the number "
+    "of subjects per sex, diagnosis, subject group, assessment tool and image contrast type, the number "
+    "of imaging sessions, and the distribution of ages. The summary references the dataset by its @id, "
+    "so that it can be served without querying every subject."
+)
+NOT_STREAMED_HELP = "Cannot be combined with --stream or --delta."
+METRICS_FILE_HELP = (
+    "The path of a text file to which to write metrics of the run in the OpenMetrics (Prometheus) "
+    "text format, e.g. for the node exporter textfile collector. The file is written also if the run "
+    "fails. By default, no metrics are recorded."
+)
+CSV_ENGINE_HELP = (
+    "The parser with which to read the phenotypic .tsv file. The pyarrow parser uses multiple threads, "
+    "which is faster for large files, but requires the optional pyarrow package."
+)
+
+
 @bagel.command()
+@_recorded(dataset="name")
+@_fingerprinted("pheno", input_files=("pheno", "dictionary"))
 def pheno(
-    pheno: Path = typer.Option(
+    pheno: List[Path] = typer.Option(
         ...,
-        help="The path to a phenotypic .tsv file.",
+        help=PHENO_HELP,
         exists=True,
         file_okay=True,
         dir_okay=False,
     ),
-    dictionary: Path = typer.Option(
+    dictionary: List[Path] = typer.Option(
         ...,
-        help="The path to the .json data dictionary "
-        "corresponding to the phenotypic .tsv file.",
+        help=DICTIONARY_HELP,
         exists=True,
         file_okay=True,
         dir_okay=False,
     ),
     output: Path = typer.Option(
         ...,
-        help="The directory where outputs should be created.",
+        help=OUTPUT_HELP,
         exists=True,
         file_okay=False,
         dir_okay=True,
     ),
     name: str = typer.Option(
         ...,
-        help="A descriptive name for the dataset the input belongs to. "
-        "This name is expected to match the name field in the BIDS "
-        "dataset_description.json file.",
+        help=NAME_HELP,
+    ),
+    compression: Compression = typer.Option(
+        Compression.none,
+        help=COMPRESSION_HELP,
+    ),
+    jobs: int = typer.Option(
+        1,
+        help="The number of processes in which to create the subjects, and to encode and write the output "
+        "shards. Subjects are written in the same order regardless of the number of processes.",
+        min=1,
+    ),
+    shards: int = typer.Option(
+        None,
+        help=SHARDS_HELP,
+        min=1,
+    ),
+    shard_size: int = typer.Option(
+        None,
+        help=SHARD_SIZE_HELP,
+        min=1,
+    ),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.jsonld,
+        "--format",
+        help=FORMAT_HELP,
+    ),
+    skip_if_unchanged: bool = typer.Option(
+        False,
+        help=SKIP_IF_UNCHANGED_HELP.format(output_name="pheno"),
+    ),
+    summary: bool = typer.Option(
+        False,
+        help="Whether to also write summary statistics of the subjects to pheno_summary.json: the number "
+        "of subjects per sex, diagnosis, subject group and assessment tool, and the distribution of ages. "
+        "The summary references the dataset by its @id, so that it can be served without querying every subject.",
+    ),
+    csv_engine: CSVEngine = typer.Option(
+        CSVEngine.c,
+        help=CSV_ENGINE_HELP,
+    ),
+    metrics_file: Path = typer.Option(
+        None,
+        help=METRICS_FILE_HELP,
+        file_okay=True,
+        dir_okay=False,
     ),
 ):
     """
@@ -54,178 +435,904 @@ def pheno(
     graph datamodel for the provided phenotypic file in the .jsonld format.
     You can upload this .jsonld file to the Neurobagel graph.
     """
-    data_dictionary = load_json(dictionary)
-    pheno_df = pd.read_csv(pheno, sep="\t", keep_default_na=False, dtype=str)
-    putil.validate_inputs(data_dictionary, pheno_df)
-
-    subject_list = []
-
-    column_mapping = putil.map_categories_to_columns(data_dictionary)
-    tool_mapping = putil.map_tools_to_columns(data_dictionary)
-
-    # TODO: needs refactoring once we handle multiple participant IDs
-    participants = column_mapping.get("participant")[0]
-
-    for participant in pheno_df[participants].unique():
-        # TODO: needs refactoring once we handle phenotypic information at the session level
-        # for the moment we are not creating any session instances in the phenotypic graph
-        # we treat the phenotypic information in the first row of the _sub_pheno dataframe
-        # as reflecting the subject level phenotypic information
-        _sub_pheno = pheno_df.query(
-            f"{participants} == '{str(participant)}'"
-        ).iloc[0]
-
-        subject = models.Subject(label=str(participant))
-        if "sex" in column_mapping.keys():
-            subject.sex = models.ControlledTerm(
-                identifier=putil.get_transformed_values(
-                    column_mapping["sex"], _sub_pheno, data_dictionary
+    _check_shard_options(shards, shard_size, output_format)
+    run_metrics = mutil.current_run()
+    with run_metrics.stage("read"):
+        data_dictionary, pheno_df = putil.read_merged_pheno_inputs(
+            phenos=pheno, dictionaries=dictionary, engine=csv_engine
+        )
+    if summary:
+        with run_metrics.stage("summarize"):
+            dataset_summary = putil.summarize_pheno(data_dictionary, pheno_df)
+
+    if output_format != OutputFormat.jsonld:
+        dataset_dict = models.model_to_dict(
+            models.Dataset(label=name, hasSamples=[])
+        )
+        # Subjects are written as they are created, without keeping them all in memory
+        with run_metrics.stage("build_and_write"):
+            _write_rdf(
+                dataset_dict,
+                run_metrics.count_items(
+                    "subjects_built",
+                    putil.iter_subject_dicts(
+                        data_dictionary, pheno_df, jobs=jobs
+                    ),
                 ),
-                schemaKey="Sex",
+                output / f"pheno.{output_format.value}",
+                output_format,
+                compression,
             )
-
-        if "diagnosis" in column_mapping.keys():
-            _dx_val = putil.get_transformed_values(
-                column_mapping["diagnosis"], _sub_pheno, data_dictionary
+        if summary:
+            _write_summary(
+                dataset_summary, dataset_dict, output / "pheno_summary.json"
             )
-            if _dx_val is None:
-                pass
-            elif _dx_val == mappings.NEUROBAGEL["healthy_control"]:
-                subject.isSubjectGroup = models.ControlledTerm(
-                    identifier=mappings.NEUROBAGEL["healthy_control"],
-                    schemaKey="SubjectGroup",
-                )
-            else:
-                subject.diagnosis = [
-                    models.ControlledTerm(
-                        identifier=_dx_val, schemaKey="Diagnosis"
-                    )
-                ]
+        return
+
+    with run_metrics.stage("build"):
+        dataset_dict = putil.create_dataset_dict(
+            data_dictionary, pheno_df, name=name, jobs=jobs
+        )
+    run_metrics.add("subjects_built", len(dataset_dict["hasSamples"]))
+    with run_metrics.stage("write"):
+        _write_jsonld(
+            dataset_dict,
+            output / "pheno.jsonld",
+            compression,
+            shards=shards,
+            shard_size=shard_size,
+            jobs=jobs,
+        )
+    if summary:
+        _write_summary(
+            dataset_summary, dataset_dict, output / "pheno_summary.json"
+        )
 
-        if "age" in column_mapping.keys():
-            subject.age = putil.get_transformed_values(
-                column_mapping["age"], _sub_pheno, data_dictionary
-            )
 
-        if tool_mapping:
-            _assessments = [
-                models.ControlledTerm(identifier=tool, schemaKey="Assessment")
-                for tool, columns in tool_mapping.items()
-                if putil.are_not_missing(columns, _sub_pheno, data_dictionary)
-            ]
-            if _assessments:
-                # Only set assignments for the subject if at least one is not missing
-                subject.assessment = _assessments
+@bagel.command()
+def validate(
+    pheno: Path = typer.Option(
+        ...,
+        help="The path to a phenotypic .tsv file.",
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    dictionary: Path = typer.Option(
+        ...,
+        help="The path to the .json data dictionary "
+        "corresponding to the phenotypic .tsv file.",
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    csv_engine: CSVEngine = typer.Option(
+        CSVEngine.c,
+        help=CSV_ENGINE_HELP,
+    ),
+):
+    """
+    Check whether a phenotypic file (.tsv) and its data dictionary (.json) are valid inputs
+    for the pheno command, without creating any output.
 
-        subject_list.append(subject)
+    All errors and warnings found are printed as a .json report, and the command exits
+    with an error if the inputs are not valid.
+    """
+    data_dictionary = load_json(dictionary)
+    pheno_df = putil.read_pheno_file(pheno, data_dictionary, csv_engine)
 
-    dataset = models.Dataset(label=name, hasSamples=subject_list)
-    context = putil.generate_context()
-    # We can't just exclude_unset here because the identifier and schemaKey
-    # for each instance are created as default values and so technically are never set
-    # TODO: we should revisit this because there may be reasons to have None be meaningful in the future
-    context.update(**dataset.dict(exclude_none=True))
+    errors = []
+    warnings = []
+    for problem in putil.find_input_problems(data_dictionary, pheno_df):
+        if isinstance(problem, Warning):
+            warnings.append(str(problem))
+        else:
+            errors.append(
+                {"type": type(problem).__name__, "message": str(problem)}
+            )
 
-    with open(output / "pheno.jsonld", "w") as f:
-        f.write(json.dumps(context, indent=2))
+    print(
+        json.dumps(
+            {"valid": not errors, "errors": errors, "warnings": warnings},
+            indent=2,
+        )
+    )
+    if errors:
+        raise typer.Exit(code=1)
 
 
 @bagel.command()
+@_recorded()
+@_fingerprinted(
+    "pheno_bids", input_files=("jsonld_path",), bids_dir="bids_dir"
+)
 def bids(
     jsonld_path: Path = typer.Option(
         ...,
-        help="The path to a pheno.jsonld file.",
+        help="The path to a pheno.jsonld file, which may be compressed (.jsonld.gz or .jsonld.xz).",
         exists=True,
         file_okay=True,
         dir_okay=False,
     ),
     bids_dir: Path = typer.Option(
         ...,
-        help="The path to the corresponding BIDS dataset directory.",
+        help=BIDS_DIR_HELP,
         exists=True,
         file_okay=False,
         dir_okay=True,
     ),
     output: Path = typer.Option(
         ...,
-        help="The directory where outputs should be created",
+        help=OUTPUT_HELP,
         exists=True,
         file_okay=False,
         dir_okay=True,
     ),
+    resolve_symlinks: bool = typer.Option(
+        True,
+        help=RESOLVE_SYMLINKS_HELP,
+    ),
+    validate: bool = typer.Option(
+        True,
+        help=VALIDATE_HELP,
+    ),
+    validation_cache: Path = typer.Option(
+        None,
+        help=VALIDATION_CACHE_HELP,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    minimal_index: bool = typer.Option(
+        True,
+        help=MINIMAL_INDEX_HELP,
+    ),
+    aggregate_acquisitions: bool = typer.Option(
+        False,
+        help=AGGREGATE_ACQUISITIONS_HELP,
+    ),
+    count_runs: bool = typer.Option(
+        False,
+        help=COUNT_RUNS_HELP,
+    ),
+    acquisition_metadata: bool = typer.Option(
+        False,
+        help=ACQUISITION_METADATA_HELP,
+    ),
+    stream: bool = typer.Option(
+        False,
+        help="Whether to read and write the phenotypic subjects one at a time instead of loading "
+        "the whole .jsonld file into memory. Only subjects that have BIDS data are validated and rebuilt.",
+    ),
+    delta: bool = typer.Option(
+        False,
+        help="Whether to write only the imaging sessions and acquisitions, linked to the existing "
+        "subjects of the phenotypic .jsonld file, to bids_delta.jsonld instead of writing the full "
+        "dataset to pheno_bids.jsonld. The delta output can be loaded into a graph that already "
+        "contains the phenotypic data.",
+    ),
+    compression: Compression = typer.Option(
+        Compression.none,
+        help=COMPRESSION_HELP,
+    ),
+    shards: int = typer.Option(
+        None,
+        help=SHARDS_HELP + " " + NOT_STREAMED_HELP,
+        min=1,
+    ),
+    shard_size: int = typer.Option(
+        None,
+        help=SHARD_SIZE_HELP,
+        min=1,
+    ),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.jsonld,
+        "--format",
+        help=FORMAT_HELP + " " + NOT_STREAMED_HELP,
+    ),
+    skip_if_unchanged: bool = typer.Option(
+        False,
+        help=SKIP_IF_UNCHANGED_HELP.format(output_name="pheno_bids"),
+    ),
+    summary: bool = typer.Option(
+        False,
+        help=PHENO_BIDS_SUMMARY_HELP + " " + NOT_STREAMED_HELP,
+    ),
+    metrics_file: Path = typer.Option(
+        None,
+        help=METRICS_FILE_HELP,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    checkpoint: bool = typer.Option(
+        False,
+        help="Whether to record the progress of the run in bids.checkpoint/ in the output directory: "
+        "the index of the BIDS dataset and the sessions created for each subject. "
+        "The checkpoint is removed once the run succeeds. See --resume.",
+    ),
+    checkpoint_interval: int = typer.Option(
+        100,
+        help="The number of subjects after which their sessions are saved to the checkpoint.",
+        min=1,
+    ),
+    resume: bool = typer.Option(
+        False,
+        help="Whether to continue from the checkpoint of an interrupted run, if there is one, "
+        "instead of indexing the BIDS dataset and creating the sessions of processed subjects again. "
+        "Implies --checkpoint. A checkpoint of a run with a changed BIDS dataset, bagel version "
+        "or options is discarded.",
+    ),
 ):
-    jsonld = load_json(jsonld_path)
-    layout = BIDSLayout(bids_dir, validate=True)
+    _check_shard_options(shards, shard_size, output_format)
+    if (
+        shards is not None
+        or shard_size is not None
+        or output_format != OutputFormat.jsonld
+    ) and (stream or delta):
+        raise typer.BadParameter(
+            "--shards, --shard-size and --format cannot be combined with --stream or --delta."
+        )
+    if summary and (stream or delta):
+        raise typer.BadParameter(
+            "--summary cannot be combined with --stream or --delta."
+        )
 
-    # Strip and store context to be added back later, since it's not part of
-    # (and can't be easily added) to the existing data model
-    context = {"@context": jsonld.pop("@context")}
-
-    try:
-        pheno_dataset = models.Dataset.parse_obj(jsonld)
-    except ValidationError as err:
-        print(err)
+    session_checkpoint = None
+    if checkpoint or resume:
+        session_checkpoint = butil.SessionCheckpoint(
+            output / "bids.checkpoint",
+            bids_dir=bids_dir,
+            options={
+                "resolve_symlinks": resolve_symlinks,
+                "minimal_index": minimal_index,
+                "aggregate_acquisitions": aggregate_acquisitions,
+                "count_runs": count_runs,
+                "acquisition_metadata": acquisition_metadata,
+            },
+            resume=resume,
+            interval=checkpoint_interval,
+        )
+        if session_checkpoint.resumed:
+            print(
+                f"Resuming from the checkpoint in {session_checkpoint.checkpoint_dir}, "
+                f"with {len(session_checkpoint.sessions)} subject(s) already processed."
+            )
 
-    pheno_subject_dict = {
-        pheno_subject.label: pheno_subject
-        for pheno_subject in getattr(pheno_dataset, "hasSamples")
+    run_metrics = mutil.current_run()
+    run_metrics.labels["dataset"] = butil.get_dataset_name(bids_dir)
+    bids_options = {
+        "validate": validate,
+        "validation_cache": validation_cache,
+        "minimal_index": minimal_index,
+        "resolve_symlinks": resolve_symlinks,
+        "checkpoint": session_checkpoint,
     }
-    bids_subject_list = ["sub-" + sub_id for sub_id in layout.get_subjects()]
 
-    butil.check_unique_bids_subjects(
-        pheno_subjects=pheno_subject_dict.keys(),
-        bids_subjects=bids_subject_list,
+    if not (stream or delta):
+        with run_metrics.stage("read"):
+            jsonld = load_json(jsonld_path)
+
+            # Strip and store context to be added back later, since it's not part of
+            # (and can't be easily added) to the existing data model
+            context = {"@context": jsonld.pop("@context")}
+
+            try:
+                pheno_dataset = models.Dataset.parse_obj(jsonld)
+            except ValidationError as err:
+                print(err)
+
+        butil.add_bids_to_dataset(
+            pheno_dataset,
+            bids_dir,
+            aggregate_acquisitions=aggregate_acquisitions,
+            count_runs=count_runs,
+            acquisition_metadata=acquisition_metadata,
+            **bids_options,
+        )
+
+        with run_metrics.stage("write"):
+            dataset_dict = models.model_to_dict(pheno_dataset)
+            if output_format != OutputFormat.jsonld:
+                _write_rdf(
+                    dataset_dict,
+                    dataset_dict["hasSamples"],
+                    output / f"pheno_bids.{output_format.value}",
+                    output_format,
+                    compression,
+                    context=context,
+                )
+            else:
+                _write_jsonld(
+                    dataset_dict,
+                    output / "pheno_bids.jsonld",
+                    compression,
+                    context=context,
+                    shards=shards,
+                    shard_size=shard_size,
+                )
+        if summary:
+            with run_metrics.stage("summarize"):
+                _write_summary(
+                    putil.summarize_subject_dicts(dataset_dict["hasSamples"]),
+                    dataset_dict,
+                    output / "pheno_bids_summary.json",
+                )
+        if session_checkpoint is not None:
+            session_checkpoint.remove()
+        return
+
+    layout, session_paths = butil.index_bids_dataset(bids_dir, **bids_options)
+    bids_subject_list = ["sub-" + sub_id for sub_id in layout.get_subjects()]
+    metadata_resolver = (
+        butil.SidecarMetadataResolver(layout.root)
+        if acquisition_metadata
+        else None
+    )
+    create_sessions = (
+        butil.create_sessions
+        if session_checkpoint is None
+        else session_checkpoint.create_sessions
     )
 
-    for bids_sub_id in layout.get_subjects():
-        pheno_subject = pheno_subject_dict.get(f"sub-{bids_sub_id}")
-        session_list = []
-
-        bids_sessions = layout.get_sessions(subject=bids_sub_id)
-        if not bids_sessions:
-            if not layout.get_datatypes(subject=bids_sub_id):
-                continue
-            bids_sessions = [None]
-
-        # For some reason .get_sessions() doesn't always follow alphanumeric order
-        # By default (without sorting) the session lists look like ["02", "01"] per subject
-        for session in sorted(bids_sessions):
-            image_list = butil.create_acquisitions(
-                layout=layout,
-                bids_sub_id=bids_sub_id,
-                session=session,
+    if delta:
+        pheno_subject_ids = {
+            pheno_subject["label"]: pheno_subject["identifier"]
+            for key, value in iter_json_fields(
+                jsonld_path, stream_key="hasSamples"
             )
+            if key == "hasSamples"
+            for pheno_subject in value
+        }
+        butil.check_unique_bids_subjects(
+            pheno_subjects=pheno_subject_ids.keys(),
+            bids_subjects=bids_subject_list,
+        )
 
-            # If subject's session has no image files, a Session object is not added
-            if not image_list:
-                continue
-
-            # TODO: Currently if a subject has BIDS data but no "ses-" directories (e.g., only 1 session),
-            # we create a session for that subject with a custom label "ses-nb01" to be added to the graph
-            # so the API can still find the session-level information.
-            # This should be revisited in the future as for these cases the resulting dataset object is not
-            # an exact representation of what's on disk.
-            session_label = "nb01" if session is None else session
-            session_path = butil.get_session_path(
-                layout=layout,
-                bids_dir=bids_dir,
-                bids_sub_id=bids_sub_id,
-                session=session,
+        def delta_subjects():
+            for bids_sub_id in layout.get_subjects():
+                session_list = create_sessions(
+                    layout=layout,
+                    bids_sub_id=bids_sub_id,
+                    session_paths=session_paths,
+                    aggregate_acquisitions=aggregate_acquisitions,
+                    count_runs=count_runs,
+                    metadata_resolver=metadata_resolver,
+                    resolve_symlinks=resolve_symlinks,
+                )
+                if not session_list:
+                    continue
+                # Only the subject @id is needed to link the sessions to the existing subject node
+                yield {
+                    "identifier": pheno_subject_ids[f"sub-{bids_sub_id}"],
+                    "hasSession": [
+                        models.model_to_dict(session)
+                        for session in session_list
+                    ],
+                }
+
+        delta_output = add_compression_suffix(
+            output / "bids_delta.jsonld", compression
+        )
+        with run_metrics.stage("build_and_write"), open_file(
+            delta_output, "w", compression
+        ) as f:
+            write_json_fields(
+                f,
+                [
+                    ("@context", putil.generate_context()["@context"]),
+                    ("@graph", delta_subjects()),
+                ],
             )
+        run_metrics.add_file_size("bytes_written", delta_output)
+        if session_checkpoint is not None:
+            session_checkpoint.remove()
+        return
 
-            # TODO: needs refactoring once we also handle phenotypic information at the session level
-            session_list.append(
-                # Add back "ses" prefix because pybids stripped it
-                models.Session(
-                    label="ses-" + session_label,
-                    filePath=session_path,
-                    hasAcquisition=image_list,
+    if stream:
+        bids_subjects = set(bids_subject_list)
+        pheno_subjects = set()
+
+        def add_sessions(pheno_subject_iter):
+            # Subjects without BIDS data are passed through as they are, without validation
+            for pheno_subject in pheno_subject_iter:
+                pheno_subjects.add(pheno_subject["label"])
+                if pheno_subject["label"] not in bids_subjects:
+                    yield pheno_subject
+                    continue
+                session_list = create_sessions(
+                    layout=layout,
+                    bids_sub_id=pheno_subject["label"].removeprefix("sub-"),
+                    session_paths=session_paths,
+                    aggregate_acquisitions=aggregate_acquisitions,
+                    count_runs=count_runs,
+                    metadata_resolver=metadata_resolver,
+                    resolve_symlinks=resolve_symlinks,
                 )
+                if session_list is None:
+                    yield pheno_subject
+                    continue
+                subject = models.Subject.parse_obj(pheno_subject)
+                subject.hasSession = session_list
+                yield models.model_to_dict(subject)
+
+        def update_field(key, value):
+            if key == "hasSamples":
+                return add_sessions(value)
+            if key == "@context":
+                return putil.update_context({key: value})[key]
+            return value
+
+        final_output = add_compression_suffix(
+            output / "pheno_bids.jsonld", compression
+        )
+        partial_output = final_output.with_name(f"{final_output.name}.part")
+        with run_metrics.stage("build_and_write"), open_file(
+            partial_output, "w", compression
+        ) as f:
+            write_json_fields(
+                f,
+                (
+                    (key, update_field(key, value))
+                    for key, value in iter_json_fields(
+                        jsonld_path, stream_key="hasSamples"
+                    )
+                ),
+            )
+        try:
+            butil.check_unique_bids_subjects(
+                pheno_subjects=pheno_subjects,
+                bids_subjects=bids_subject_list,
+            )
+        except LookupError:
+            partial_output.unlink()
+            raise
+        partial_output.replace(final_output)
+        run_metrics.add_file_size("bytes_written", final_output)
+        if session_checkpoint is not None:
+            session_checkpoint.remove()
+        return
+
+
+@bagel.command()
+@_recorded(dataset="name")
+@_fingerprinted(
+    "pheno_bids", input_files=("pheno", "dictionary"), bids_dir="bids_dir"
+)
+def run(
+    pheno: List[Path] = typer.Option(
+        ...,
+        help=PHENO_HELP,
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    dictionary: List[Path] = typer.Option(
+        ...,
+        help=DICTIONARY_HELP,
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    bids_dir: Path = typer.Option(
+        ...,
+        help=BIDS_DIR_HELP,
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+    ),
+    output: Path = typer.Option(
+        ...,
+        help=OUTPUT_HELP,
+        exists=True,
+        file_okay=False,
+        dir_okay=True,
+    ),
+    name: str = typer.Option(
+        ...,
+        help=NAME_HELP,
+    ),
+    resolve_symlinks: bool = typer.Option(
+        True,
+        help=RESOLVE_SYMLINKS_HELP,
+    ),
+    validate: bool = typer.Option(
+        True,
+        help=VALIDATE_HELP,
+    ),
+    validation_cache: Path = typer.Option(
+        None,
+        help=VALIDATION_CACHE_HELP,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    minimal_index: bool = typer.Option(
+        True,
+        help=MINIMAL_INDEX_HELP,
+    ),
+    aggregate_acquisitions: bool = typer.Option(
+        False,
+        help=AGGREGATE_ACQUISITIONS_HELP,
+    ),
+    count_runs: bool = typer.Option(
+        False,
+        help=COUNT_RUNS_HELP,
+    ),
+    acquisition_metadata: bool = typer.Option(
+        False,
+        help=ACQUISITION_METADATA_HELP,
+    ),
+    compression: Compression = typer.Option(
+        Compression.none,
+        help=COMPRESSION_HELP,
+    ),
+    shards: int = typer.Option(
+        None,
+        help=SHARDS_HELP,
+        min=1,
+    ),
+    shard_size: int = typer.Option(
+        None,
+        help=SHARD_SIZE_HELP,
+        min=1,
+    ),
+    output_format: OutputFormat = typer.Option(
+        OutputFormat.jsonld,
+        "--format",
+        help=FORMAT_HELP,
+    ),
+    skip_if_unchanged: bool = typer.Option(
+        False,
+        help=SKIP_IF_UNCHANGED_HELP.format(output_name="pheno_bids"),
+    ),
+    summary: bool = typer.Option(
+        False,
+        help=PHENO_BIDS_SUMMARY_HELP,
+    ),
+    csv_engine: CSVEngine = typer.Option(
+        CSVEngine.c,
+        help=CSV_ENGINE_HELP,
+    ),
+    metrics_file: Path = typer.Option(
+        None,
+        help=METRICS_FILE_HELP,
+        file_okay=True,
+        dir_okay=False,
+    ),
+):
+    """
+    Process an annotated phenotypic file (.tsv) and the corresponding BIDS dataset in one go.
+
+    This is equivalent to running the pheno and bids commands one after the other, but the
+    phenotypic subjects are kept in memory instead of being written to and read back from
+    an intermediate pheno.jsonld file. The output is written to pheno_bids.jsonld
+    (or pheno_bids.nt/.nq).
+    """
+    _check_shard_options(shards, shard_size, output_format)
+    dataset = putil.load_pheno_dataset(
+        pheno, dictionary, name=name, engine=csv_engine
+    )
+    butil.add_bids_to_dataset(
+        dataset,
+        bids_dir,
+        validate=validate,
+        validation_cache=validation_cache,
+        minimal_index=minimal_index,
+        resolve_symlinks=resolve_symlinks,
+        aggregate_acquisitions=aggregate_acquisitions,
+        count_runs=count_runs,
+        acquisition_metadata=acquisition_metadata,
+    )
+
+    run_metrics = mutil.current_run()
+    with run_metrics.stage("write"):
+        dataset_dict = models.model_to_dict(dataset)
+        if output_format != OutputFormat.jsonld:
+            _write_rdf(
+                dataset_dict,
+                dataset_dict["hasSamples"],
+                output / f"pheno_bids.{output_format.value}",
+                output_format,
+                compression,
+            )
+        else:
+            _write_jsonld(
+                dataset_dict,
+                output / "pheno_bids.jsonld",
+                compression,
+                shards=shards,
+                shard_size=shard_size,
+            )
+    if summary:
+        with run_metrics.stage("summarize"):
+            _write_summary(
+                putil.summarize_subject_dicts(dataset_dict["hasSamples"]),
+                dataset_dict,
+                output / "pheno_bids_summary.json",
             )
 
-        pheno_subject.hasSession = session_list
 
-    merged_dataset = {**context, **pheno_dataset.dict(exclude_none=True)}
+@bagel.command()
+@_recorded()
+def batch(
+    manifest: Path = typer.Option(
+        ...,
+        help="The path to a .tsv file with one row per dataset to process with the bids command, "
+        "and the columns jsonld_path, bids_dir and output.",
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    report: Path = typer.Option(
+        ...,
+        help="The path of the .json file where the status and duration of each dataset should be reported.",
+        file_okay=True,
+        dir_okay=False,
+    ),
+    jobs: int = typer.Option(
+        os.cpu_count(),
+        help="The maximum number of datasets to process at the same time.",
+        min=1,
+    ),
+    timeout: float = typer.Option(
+        None,
+        help="The maximum number of seconds to spend processing a single dataset.",
+        min=0,
+    ),
+    resolve_symlinks: bool = typer.Option(
+        True,
+        help=RESOLVE_SYMLINKS_HELP,
+    ),
+    validate: bool = typer.Option(
+        True,
+        help=VALIDATE_HELP,
+    ),
+    minimal_index: bool = typer.Option(
+        True,
+        help=MINIMAL_INDEX_HELP,
+    ),
+    aggregate_acquisitions: bool = typer.Option(
+        False,
+        help=AGGREGATE_ACQUISITIONS_HELP,
+    ),
+    count_runs: bool = typer.Option(
+        False,
+        help=COUNT_RUNS_HELP,
+    ),
+    acquisition_metadata: bool = typer.Option(
+        False,
+        help=ACQUISITION_METADATA_HELP,
+    ),
+    stream: bool = typer.Option(
+        False,
+        help="Whether to read and write the phenotypic subjects one at a time instead of loading "
+        "the whole .jsonld files into memory.",
+    ),
+    delta: bool = typer.Option(
+        False,
+        help="Whether to write only the imaging sessions and acquisitions of each dataset to bids_delta.jsonld.",
+    ),
+    compression: Compression = typer.Option(
+        Compression.none,
+        help=COMPRESSION_HELP,
+    ),
+    skip_if_unchanged: bool = typer.Option(
+        False,
+        help="Whether to skip datasets whose inputs, options, bagel version and outputs are unchanged since "
+        "their last successful run. See the --skip-if-unchanged option of the bids command.",
+    ),
+    metrics_file: Path = typer.Option(
+        None,
+        help=METRICS_FILE_HELP
+        + " The metrics of a batch are the number of datasets by status and the overall duration and "
+        "memory use of the batch, not of each dataset.",
+        file_okay=True,
+        dir_okay=False,
+    ),
+    resume: bool = typer.Option(
+        False,
+        help="Whether to record a checkpoint of each dataset in its output directory, and continue "
+        "from the checkpoint of an interrupted run of a dataset. See the --resume option of the bids command.",
+    ),
+):
+    """
+    Run the bids command on many datasets in parallel, each in its own process.
+
+    A dataset that fails or times out does not stop the others from being processed.
+    The status and duration of every dataset are written to the report, and the command
+    exits with an error if any dataset could not be processed.
+    """
+    start = time.perf_counter()
+    dataset_reports = batch_utils.run_in_processes(
+        task=partial(
+            bids,
+            resolve_symlinks=resolve_symlinks,
+            validate=validate,
+            validation_cache=None,
+            minimal_index=minimal_index,
+            aggregate_acquisitions=aggregate_acquisitions,
+            count_runs=count_runs,
+            acquisition_metadata=acquisition_metadata,
+            stream=stream,
+            delta=delta,
+            compression=compression,
+            shards=None,
+            shard_size=None,
+            output_format=OutputFormat.jsonld,
+            skip_if_unchanged=skip_if_unchanged,
+            summary=False,
+            metrics_file=None,
+            checkpoint=resume,
+            checkpoint_interval=100,
+            resume=resume,
+        ),
+        entries=batch_utils.read_manifest(manifest),
+        jobs=jobs,
+        timeout=timeout,
+    )
+    n_succeeded = sum(
+        dataset_report["status"] == "success"
+        for dataset_report in dataset_reports
+    )
+    run_metrics = mutil.current_run()
+    for dataset_report in dataset_reports:
+        run_metrics.add("datasets", status=dataset_report["status"])
+
+    with open(report, "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "n_datasets": len(dataset_reports),
+                    "n_succeeded": n_succeeded,
+                    "duration_s": round(time.perf_counter() - start, 3),
+                    "datasets": dataset_reports,
+                },
+                indent=2,
+            )
+        )
+
+    if n_succeeded < len(dataset_reports):
+        print(
+            f"{len(dataset_reports) - n_succeeded} of {len(dataset_reports)} datasets "
+            f"could not be processed. See {report} for details."
+        )
+        raise typer.Exit(code=1)
+
+
+@bagel.command()
+def upload(
+    jsonld_path: List[Path] = typer.Option(
+        ...,
+        help="The path to a .jsonld file created by the pheno, bids or run command, which may be compressed. "
+        "Can be given multiple times to upload several files.",
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    url: str = typer.Option(
+        ...,
+        help="The URL of the graph endpoint that accepts JSON-LD documents (application/ld+json) by POST, "
+        "e.g. the statements endpoint of a graph repository.",
+    ),
+    batch_size: int = typer.Option(
+        1000,
+        help="The number of subjects to send in each request.",
+        min=1,
+    ),
+    jobs: int = typer.Option(
+        4,
+        help="The maximum number of requests to send at the same time.",
+        min=1,
+    ),
+    retries: int = typer.Option(
+        3,
+        help="The number of times to retry a request that failed because of a connection or server error.",
+        min=0,
+    ),
+    backoff: float = typer.Option(
+        1.0,
+        help="The number of seconds to wait before the first retry of a request. "
+        "The wait time doubles with each further retry.",
+        min=0,
+    ),
+    state: Path = typer.Option(
+        None,
+        help="The path to a .json file in which to record the batches that were uploaded. "
+        "When an upload to the same --url is rerun with the same state file, batches that were already "
+        "uploaded are skipped, unless the .jsonld file or the batch size has changed since.",
+        file_okay=True,
+        dir_okay=False,
+    ),
+    username: str = typer.Option(
+        None,
+        help="The username for HTTP basic authentication with the graph endpoint.",
+    ),
+    password: str = typer.Option(
+        None,
+        help="The password for HTTP basic authentication with the graph endpoint.",
+        envvar="BAGEL_UPLOAD_PASSWORD",
+    ),
+):
+    """
+    Upload the subjects of one or more .jsonld files to a graph endpoint, in batches.
+
+    Each batch is sent as a self-contained JSON-LD document. If any batch cannot be uploaded,
+    the command exits with an error, and can be rerun with the same --state file to upload
+    only the remaining batches.
+    """
+    upload_report = uutil.upload_jsonld_files(
+        jsonld_paths=jsonld_path,
+        url=url,
+        batch_size=batch_size,
+        jobs=jobs,
+        retries=retries,
+        backoff=backoff,
+        state_p=state,
+        username=username,
+        password=password,
+    )
+    print(json.dumps(upload_report, indent=2))
+
+    if upload_report["failed"]:
+        raise typer.Exit(code=1)
+
+
+@bagel.command()
+def bench(
+    output: Path = typer.Option(
+        ...,
+        help="The path of the .json file where the benchmark results should be saved. "
+        "The file can be used as a baseline for later runs.",
+        file_okay=True,
+        dir_okay=False,
+    ),
+    baseline: Path = typer.Option(
+        None,
+        help="The path to the results of an earlier benchmark run to compare against.",
+        exists=True,
+        file_okay=True,
+        dir_okay=False,
+    ),
+    threshold: float = typer.Option(
+        0.1,
+        help="The relative increase of the median run time of a scenario over the baseline "
+        "(e.g. 0.1 for 10%) above which it is reported as a regression.",
+        min=0,
+    ),
+    repeats: int = typer.Option(
+        5,
+        help="The number of timed runs of each scenario.",
+        min=1,
+    ),
+    size: List[int] = typer.Option(
+        [100, 1000],
+        help="The number of participants of a generated phenotypic file to benchmark the "
+        "pheno, validation and serialization scenarios with. Can be given multiple times.",
+        min=1,
+    ),
+    bids_size: List[int] = typer.Option(
+        [10, 50],
+        help="The number of subjects of a generated BIDS dataset to benchmark the bids scenario with. "
+        "Can be given multiple times.",
+        min=1,
+    ),
+):
+    """
+    Benchmark bagel on generated inputs of several sizes, and save the median and 95th percentile
+    run time and the peak memory use of each scenario.
+
+    If a baseline is given, the command exits with an error if any scenario got slower than
+    the baseline by more than the threshold.
+    """
+    results = bench_utils.run_benchmarks(
+        sizes=size, bids_sizes=bids_size, repeats=repeats
+    )
+    if baseline is not None:
+        results["regressions"] = bench_utils.find_regressions(
+            results, load_json(baseline), threshold
+        )
+
+    with open(output, "w") as f:
+        f.write(json.dumps(results, indent=2))
+    print(json.dumps(results, indent=2))
 
-    with open(output / "pheno_bids.jsonld", "w") as f:
-        f.write(json.dumps(merged_dataset, indent=2))
+    if results.get("regressions"):
+        raise typer.Exit(code=1)
@@ -0,0 +1,174 @@
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+METRIC_DESCRIPTIONS = {
+    "rows_read": "Number of rows read from phenotypic files.",
+    "subjects_built": "Number of subjects created.",
+    "bids_subjects": "Number of subjects found in the BIDS dataset.",
+    "sessions_found": "Number of imaging sessions created from the BIDS dataset.",
+    "acquisitions_found": "Number of acquisitions created from the BIDS dataset.",
+    "validation_warnings": "Number of warnings raised while validating the inputs.",
+    "bytes_written": "Number of bytes written to output files.",
+    "datasets": "Number of datasets processed, by status.",
+    "stage_duration_seconds": "Time spent in each stage of the run.",
+    "run_duration_seconds": "Total duration of the run.",
+    "run_success": "Whether the run finished without an error (1) or not (0).",
+    "peak_rss_bytes": "Peak resident set size of the process.",
+    "last_run_timestamp_seconds": "Unix time at which the run finished.",
+}
+
+
+def _escape_label_value(value) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+def _format_labels(labels: dict) -> str:
+    return (
+        "{"
+        + ",".join(
+            f'{name}="{_escape_label_value(value)}"'
+            for name, value in labels.items()
+        )
+        + "}"
+    )
+
+
+def get_peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of the current process in bytes, if it can be measured."""
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class RunMetrics:
+    """
+    Collects the metrics of a single command run. If the metrics are not enabled,
+    nothing is recorded and all methods return immediately.
+    """
+
+    def __init__(self, command: str = "", enabled: bool = False):
+        self.enabled = enabled
+        self.labels = {"command": command, "dataset": ""}
+        self.values = {}
+        self.start = time.perf_counter()
+
+    def add(self, name: str, value: float = 1, **labels):
+        """Adds a value to a metric, with optional labels in addition to the labels of the run."""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self.values[key] = self.values.get(key, 0) + value
+
+    def add_file_size(self, name: str, file_p: Path):
+        if self.enabled:
+            self.add(name, Path(file_p).stat().st_size)
+
+    def stage(self, name: str):
+        """Returns a context manager that adds the time spent in it to the duration of a stage of the run."""
+        if not self.enabled:
+            return nullcontext()
+        return self._timed_stage(name)
+
+    @contextmanager
+    def _timed_stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(
+                "stage_duration_seconds",
+                time.perf_counter() - start,
+                stage=name,
+            )
+
+    def count_items(self, name: str, items: Iterable) -> Iterator:
+        """Passes through the items of an iterable, counting them as they are consumed."""
+        if not self.enabled:
+            yield from items
+            return
+        for item in items:
+            self.add(name)
+            yield item
+
+    def to_text(self) -> str:
+        """Formats the metrics in the OpenMetrics text format, as gauges prefixed with bagel_."""
+        lines = []
+        for name, description in METRIC_DESCRIPTIONS.items():
+            samples = [
+                (dict(labels), value)
+                for (metric_name, labels), value in self.values.items()
+                if metric_name == name
+            ]
+            if not samples:
+                continue
+            lines += [
+                f"# HELP bagel_{name} {description}",
+                f"# TYPE bagel_{name} gauge",
+            ]
+            lines += [
+                f"bagel_{name}{_format_labels({**self.labels, **labels})} {value}"
+                for labels, value in sorted(
+                    samples, key=lambda sample: sorted(sample[0].items())
+                )
+            ]
+        return "\n".join(lines + ["# EOF"]) + "\n"
+
+    def write(self, metrics_p: Path, success: bool):
+        """
+        Adds the overall metrics of the run and writes all metrics to a text file. The file is replaced
+        in one step, so that a collector (e.g. the node exporter textfile collector) never reads a partial file.
+        """
+        self.add("run_duration_seconds", time.perf_counter() - self.start)
+        self.add("run_success", int(success))
+        self.add("last_run_timestamp_seconds", round(time.time(), 3))
+        peak_rss = get_peak_rss()
+        if peak_rss is not None:
+            self.add("peak_rss_bytes", peak_rss)
+
+        metrics_p = Path(metrics_p)
+        fd, tmp_p = tempfile.mkstemp(
+            dir=metrics_p.parent, prefix=f".{metrics_p.name}."
+        )
+        with os.fdopen(fd, "w") as f:
+            f.write(self.to_text())
+        os.chmod(tmp_p, 0o644)
+        os.replace(tmp_p, metrics_p)
+
+
+_current_run = RunMetrics()
+
+
+@contextmanager
+def recording_run(command: str, enabled: bool) -> Iterator[RunMetrics]:
+    """
+    Records the metrics of a new run, which are returned by current_run() inside the context.
+    The previous run is restored on exit, so that a command can run another one.
+    """
+    global _current_run
+    previous_run = _current_run
+    _current_run = RunMetrics(command, enabled=enabled)
+    try:
+        yield _current_run
+    finally:
+        _current_run = previous_run
+
+
+def current_run() -> RunMetrics:
+    return _current_run
@@ -1,7 +1,9 @@
 import uuid
+from functools import lru_cache
 from typing import List, Literal, Optional, Union
 
 from pydantic import BaseModel, Extra, Field, HttpUrl
+from pydantic.fields import SHAPE_LIST
 
 UUID_PATTERN = r"[0-9a-fA-F]{8}\b-[0-9a-fA-F]{4}\b-[0-9a-fA-F]{4}\b-[0-9a-fA-F]{4}\b-[0-9a-fA-F]{12}$"
 BAGEL_UUID_PATTERN = r"^bg:" + UUID_PATTERN
@@ -17,13 +19,33 @@ class Bagel(BaseModel, extra=Extra.forbid):
     )
 
 
-class ControlledTerm(BaseModel):
+class ControlledTerm(
+    BaseModel, copy_on_model_validation="none", allow_mutation=False
+):
+    """
+    Instances are not copied when assigned to other models, so that they can be shared,
+    and cannot be modified, so that sharing them is safe.
+    """
+
     identifier: Union[str, HttpUrl]
     schemaKey: str
 
 
+@lru_cache(maxsize=None)
+def get_controlled_term(identifier: str, schemaKey: str) -> ControlledTerm:
+    """
+    Returns a shared ControlledTerm instance for each unique identifier and schemaKey,
+    so that terms repeated across subjects are only created and validated once.
+    """
+    return ControlledTerm(identifier=identifier, schemaKey=schemaKey)
+
+
 class Acquisition(Bagel):
     hasContrastType: ControlledTerm
+    numberOfRuns: Optional[int] = None
+    repetitionTime: Optional[float] = None
+    echoTime: Optional[float] = None
+    magneticFieldStrength: Optional[float] = None
     schemaKey: Literal["Acquisition"] = "Acquisition"
 
 
@@ -49,3 +71,42 @@ class Dataset(Bagel):
     label: str
     hasSamples: List[Subject]
     schemaKey: Literal["Dataset"] = "Dataset"
+
+
+@lru_cache(maxsize=None)
+def _get_field_kinds(model_class: type) -> tuple:
+    """
+    Returns the name of each field of a model class, in order, together with whether it holds
+    a plain value, a nested model ("model") or a list of nested models ("models").
+    """
+    field_kinds = []
+    for name, field in model_class.__fields__.items():
+        kind = "value"
+        if isinstance(field.type_, type) and issubclass(
+            field.type_, BaseModel
+        ):
+            kind = "models" if field.shape == SHAPE_LIST else "model"
+        field_kinds.append((name, kind))
+
+    return tuple(field_kinds)
+
+
+def model_to_dict(model: BaseModel) -> dict:
+    """
+    Fast equivalent of model.dict(exclude_none=True) for the models in this module.
+    The fields of each model class are only inspected once, and nested models are
+    converted directly instead of going through the generic pydantic export.
+    """
+    values = model.__dict__
+    model_dict = {}
+    for name, kind in _get_field_kinds(type(model)):
+        value = values[name]
+        if value is None:
+            continue
+        if kind == "model":
+            value = model_to_dict(value)
+        elif kind == "models":
+            value = [model_to_dict(item) for item in value]
+        model_dict[name] = value
+
+    return model_dict
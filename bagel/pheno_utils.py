@@ -1,15 +1,29 @@
+import math
+import re
 import warnings
 from collections import defaultdict
-from typing import Union
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Iterable, Iterator, Union
 
 import isodate
 import jsonschema
 import pandas as pd
 import pydantic
 
+import bagel.metrics_utils as mutil
 from bagel import dictionary_models, mappings, models
+from bagel.utility import CSVEngine, load_json
 
 DICTIONARY_SCHEMA = dictionary_models.DataDictionary.schema()
+# Matches the integer year/month(/day) durations typically found in age columns, e.g. "P20Y6M" or "20Y6M"
+ISO8601_AGE_PATTERN = re.compile(
+    r"^P?(?:(?P<years>\d+)Y)?(?:(?P<months>\d+)M)?(?:\d+D)?$"
+)
+# The width in years of the age bins in dataset summaries
+AGE_HISTOGRAM_BIN_WIDTH = 10
 
 
 def generate_context():
@@ -40,6 +54,17 @@ def generate_context():
     return {"@context": field_preamble}
 
 
+def update_context(context: dict) -> dict:
+    """
+    Adds the terms of the current models that a context (e.g. of an input .jsonld file created
+    by an earlier bagel version) does not define, so that a JSON-LD processor does not drop the
+    fields added since. Terms that the context already defines are kept as they are.
+    """
+    return {
+        "@context": {**generate_context()["@context"], **context["@context"]}
+    }
+
+
 def get_columns_about(data_dict: dict, concept: str) -> list:
     """
     Returns column names that have been annotated as "IsAbout" the desired concept.
@@ -115,6 +140,31 @@ def get_age_heuristic(column: str, data_dict: dict) -> str:
     return data_dict[column]["Annotations"]["Transformation"]["TermURL"]
 
 
+@lru_cache(maxsize=4096)
+def parse_iso8601_age(value: str) -> float:
+    """
+    Converts an ISO 8601 duration (with or without the leading "P") to an age in years.
+    Integer year/month durations are parsed directly, and all other forms are parsed with isodate.
+    As with isodate, any days in the duration are ignored, and durations without years or months
+    (e.g. "P5D" or "P2W") raise a ValueError. Results are cached, since age values tend to repeat
+    across participants.
+    """
+    match = ISO8601_AGE_PATTERN.match(value)
+    if match and (match["years"] or match["months"]):
+        # Dividing the total number of months gives the same result as isodate's Decimal arithmetic
+        return (12 * int(match["years"] or 0) + int(match["months"] or 0)) / 12
+
+    if not value.startswith("P"):
+        value = "P" + value
+    duration = isodate.parse_duration(value)
+    # isodate returns a timedelta instead of a Duration if there are no years or months
+    if isinstance(duration, timedelta):
+        raise ValueError(
+            f"The ISO 8601 duration {value} does not have any years or months."
+        )
+    return float(duration.years + duration.months / 12)
+
+
 def transform_age(value: str, heuristic: str) -> float:
     is_recognized_heuristic = True
     try:
@@ -128,10 +178,7 @@ def transform_age(value: str, heuristic: str) -> float:
             a_min, a_max = value.split("-")
             return (float(a_min) + float(a_max)) / 2
         if heuristic == "bg:iso8601":
-            if not value.startswith("P"):
-                value = "P" + value
-            duration = isodate.parse_duration(value)
-            return float(duration.years + duration.months / 12)
+            return parse_iso8601_age(value)
         else:
             is_recognized_heuristic = False
     except (ValueError, isodate.isoerror.ISO8601Error) as e:
@@ -180,8 +227,8 @@ def are_not_missing(columns: list, row: pd.Series, data_dict: dict) -> bool:
     """
     return all(
         [
-            not is_missing_value(value, column, data_dict)
-            for column, value in row[columns].items()
+            not is_missing_value(row[column], column, data_dict)
+            for column in columns
         ]
     )
 
@@ -207,10 +254,10 @@ def find_undefined_cat_col_values(
             known_values = list(attr["Levels"].keys()) + attr[
                 "Annotations"
             ].get("MissingValues", [])
-            unknown_values = []
-            for value in pheno_df[col].unique():
-                if value not in known_values:
-                    unknown_values.append(value)
+            unique_values = pheno_df[col].drop_duplicates()
+            unknown_values = unique_values[
+                ~unique_values.isin(known_values)
+            ].tolist()
             if unknown_values:
                 all_undefined_values[col] = unknown_values
 
@@ -227,33 +274,74 @@ def find_unused_missing_values(
     """
     all_unused_missing_vals = {}
     for col, attr in data_dict.items():
-        unused_missing_vals = []
-        for missing_val in attr["Annotations"].get("MissingValues", []):
-            if missing_val not in pheno_df[col].unique():
-                unused_missing_vals.append(missing_val)
+        missing_vals = attr["Annotations"].get("MissingValues", [])
+        if not missing_vals:
+            continue
+        unique_values = set(pheno_df[col].unique())
+        unused_missing_vals = [
+            missing_val
+            for missing_val in missing_vals
+            if missing_val not in unique_values
+        ]
         if unused_missing_vals:
             all_unused_missing_vals[col] = unused_missing_vals
 
     return all_unused_missing_vals
 
 
+def find_untransformable_age_values(
+    data_dict: dict, pheno_df: pd.DataFrame
+) -> dict:
+    """
+    Checks that the age transformation annotated in the data dictionary can be applied to all
+    non-missing age values. Returns a dictionary containing any age column names and the values
+    that could not be transformed.
+    """
+    all_untransformable_values = {}
+    # TODO: only the first age column is used to create subjects, so only it is checked
+    for col in map_categories_to_columns(data_dict).get("age", [])[:1]:
+        if is_column_categorical(col, data_dict):
+            continue
+        heuristic = get_age_heuristic(col, data_dict)
+        untransformable_values = []
+        for value in pheno_df[col].unique():
+            if is_missing_value(value, col, data_dict):
+                continue
+            try:
+                transform_age(str(value), heuristic)
+            except ValueError as e:
+                if "unrecognized age transformation" in str(e):
+                    raise
+                untransformable_values.append(value)
+        if untransformable_values:
+            all_untransformable_values[col] = untransformable_values
+
+    return all_untransformable_values
+
+
 def get_rows_with_empty_strings(df: pd.DataFrame, columns: list) -> list:
     """For specified columns, returns the indices of rows with empty strings"""
-    # NOTE: Profile this section if things get slow, transforming "" -> nan and then
-    # using .isna() will very likely be much faster
-    empty_row = df[columns].applymap(lambda cell: cell == "").apply(lambda row: any([value for value in row]), axis=1)
+    empty_row = (df[columns] == "").any(axis=1)
     return list(empty_row[empty_row].index)
 
 
-def validate_inputs(data_dict: dict, pheno_df: pd.DataFrame) -> None:
-    """Determines whether input data are valid"""
+def find_input_problems(data_dict: dict, pheno_df: pd.DataFrame) -> Iterator:
+    """
+    Runs all checks of the data dictionary and phenotypic file, and yields an exception instance
+    (ValueError or LookupError) for each error found, or a UserWarning instance for each warning.
+    Checks that depend on a previous check are skipped if that check failed.
+    """
     try:
         jsonschema.validate(data_dict, DICTIONARY_SCHEMA)
     except jsonschema.ValidationError as e:
-        raise ValueError(
+        error = ValueError(
             "The provided data dictionary is not a valid Neurobagel data dictionary. "
             "Make sure that each annotated column contains an 'Annotations' key."
-        ) from e
+        )
+        error.__cause__ = e
+        yield error
+        # None of the other checks can be run on an invalid data dictionary
+        return
 
     # TODO: remove this validation when we start handling multiple participant and / or session ID columns
     if (
@@ -271,25 +359,31 @@ def validate_inputs(data_dict: dict, pheno_df: pd.DataFrame) -> None:
         )
         > 1
     ):
-        raise ValueError(
+        yield ValueError(
             "The provided data dictionary has more than one column about participant ID or session ID."
             "Please make sure that only one column is annotated for participant and session IDs."
         )
 
     if not are_inputs_compatible(data_dict, pheno_df):
-        raise LookupError(
+        yield LookupError(
             "The provided data dictionary and phenotypic file are individually valid, "
             "but are not compatible. Make sure that you selected the correct data "
             "dictionary for your phenotypic file. Every column described in the data "
             "dictionary has to have a corresponding column with the same name in the "
             "phenotypic file"
         )
+        # The remaining checks are only run on the columns found in the phenotypic file
+        data_dict = {
+            col: attr
+            for col, attr in data_dict.items()
+            if col in pheno_df.columns
+        }
 
     undefined_cat_col_values = find_undefined_cat_col_values(
         data_dict, pheno_df
     )
     if undefined_cat_col_values:
-        raise LookupError(
+        yield LookupError(
             "Categorical column(s) in the phenotypic file have values not annotated in the data dictionary "
             f"(shown as <column_name>: [<undefined values>]): {undefined_cat_col_values}. "
             "Please check that the correct data dictionary has been selected or make sure to annotate the missing values."
@@ -297,7 +391,7 @@ def validate_inputs(data_dict: dict, pheno_df: pd.DataFrame) -> None:
 
     unused_missing_values = find_unused_missing_values(data_dict, pheno_df)
     if unused_missing_values:
-        warnings.warn(
+        yield UserWarning(
             "The following values annotated as missing values in the data dictionary were not found "
             "in the corresponding phenotypic file column(s) (<column_name>: [<unused missing values>]): "
             f"{unused_missing_values}. If this is not intentional, please check your data dictionary "
@@ -308,10 +402,543 @@ def validate_inputs(data_dict: dict, pheno_df: pd.DataFrame) -> None:
     # We cannot do the call earlier in the CLI (because it might fail for data invalid dictionaries)
     # and we need to know the column mappings in order to do the subject and session validation
     column_map = map_categories_to_columns(data_dict)
-    columns_about_ids = column_map.get("participant", []) + column_map.get("session", [])
+    columns_about_ids = column_map.get("participant", []) + column_map.get(
+        "session", []
+    )
     if row_indices := get_rows_with_empty_strings(pheno_df, columns_about_ids):
-        raise LookupError(
+        yield LookupError(
             "We have detected missing values in participant or session id columns. "
             "Please make sure that every row has a non-empty participant id (and session id where applicable)."
             f"We found missing values in the following rows (first row is zero): {row_indices}."
         )
+
+    try:
+        untransformable_age_values = find_untransformable_age_values(
+            data_dict, pheno_df
+        )
+    except ValueError as e:
+        yield e
+    else:
+        if untransformable_age_values:
+            yield ValueError(
+                "There was a problem with applying the age transformation to some of the values in the "
+                "phenotypic file (shown as <column_name>: [<values>]): "
+                f"{untransformable_age_values}. Check that the specified transformation is correct "
+                "for the age values in your data dictionary."
+            )
+
+
+def validate_inputs(data_dict: dict, pheno_df: pd.DataFrame) -> None:
+    """Determines whether input data are valid. Raises on the first error found."""
+    for problem in find_input_problems(data_dict, pheno_df):
+        if isinstance(problem, Warning):
+            warnings.warn(problem)
+            mutil.current_run().add("validation_warnings")
+        else:
+            raise problem
+
+
+def create_subject(
+    participant: str,
+    sub_pheno: pd.Series,
+    data_dict: dict,
+    column_mapping: dict,
+    tool_mapping: dict,
+) -> models.Subject:
+    """Creates a Subject object from the phenotypic values of a single participant"""
+    subject = models.Subject(label=str(participant))
+    if "sex" in column_mapping.keys():
+        _sex_val = get_transformed_values(
+            column_mapping["sex"], sub_pheno, data_dict
+        )
+        if _sex_val is not None:
+            subject.sex = models.get_controlled_term(
+                identifier=_sex_val, schemaKey="Sex"
+            )
+
+    if "diagnosis" in column_mapping.keys():
+        _dx_val = get_transformed_values(
+            column_mapping["diagnosis"], sub_pheno, data_dict
+        )
+        if _dx_val is None:
+            pass
+        elif _dx_val == mappings.NEUROBAGEL["healthy_control"]:
+            subject.isSubjectGroup = models.get_controlled_term(
+                identifier=mappings.NEUROBAGEL["healthy_control"],
+                schemaKey="SubjectGroup",
+            )
+        else:
+            subject.diagnosis = [
+                models.get_controlled_term(
+                    identifier=_dx_val, schemaKey="Diagnosis"
+                )
+            ]
+
+    if "age" in column_mapping.keys():
+        subject.age = get_transformed_values(
+            column_mapping["age"], sub_pheno, data_dict
+        )
+
+    if tool_mapping:
+        # Each subject gets its own list, only the terms in it are shared
+        _assessments = [
+            models.get_controlled_term(identifier=tool, schemaKey="Assessment")
+            for tool, columns in tool_mapping.items()
+            if are_not_missing(columns, sub_pheno, data_dict)
+        ]
+        if _assessments:
+            # Only set assignments for the subject if at least one is not missing
+            subject.assessment = _assessments
+
+    return subject
+
+
+def iter_subjects(data_dict: dict, pheno_df: pd.DataFrame) -> Iterator:
+    """Creates one Subject object per participant in a validated phenotypic file at a time, in the order they first appear"""
+    column_mapping = map_categories_to_columns(data_dict)
+    tool_mapping = map_tools_to_columns(data_dict)
+
+    # TODO: needs refactoring once we handle multiple participant IDs
+    participants = column_mapping.get("participant")[0]
+
+    # TODO: needs refactoring once we handle phenotypic information at the session level
+    # for the moment we are not creating any session instances in the phenotypic graph
+    # we treat the phenotypic information in the first row of each participant
+    # as reflecting the subject level phenotypic information
+    for _, _sub_pheno in pheno_df.drop_duplicates(
+        subset=participants
+    ).iterrows():
+        yield create_subject(
+            _sub_pheno[participants],
+            _sub_pheno,
+            data_dict,
+            column_mapping,
+            tool_mapping,
+        )
+
+
+def create_dataset(
+    data_dict: dict, pheno_df: pd.DataFrame, name: str
+) -> models.Dataset:
+    """Creates a Dataset object with one Subject per participant in a validated phenotypic file"""
+    return models.Dataset(
+        label=name, hasSamples=list(iter_subjects(data_dict, pheno_df))
+    )
+
+
+def _create_subject_dicts(data_dict: dict, pheno_df: pd.DataFrame) -> list:
+    """Creates the subjects of a group of participants in a worker process, and returns them serialized."""
+    return [
+        models.model_to_dict(subject)
+        for subject in iter_subjects(data_dict, pheno_df)
+    ]
+
+
+def iter_subject_dicts(
+    data_dict: dict, pheno_df: pd.DataFrame, jobs: int = 1
+) -> Iterator[dict]:
+    """
+    Yields the serialized subjects that iter_subjects() would create. If jobs is more than 1,
+    participants are split into contiguous groups whose subjects are created and serialized in
+    `jobs` worker processes, and then yielded in their original order.
+    """
+    if jobs <= 1:
+        for subject in iter_subjects(data_dict, pheno_df):
+            yield models.model_to_dict(subject)
+        return
+
+    participants = map_categories_to_columns(data_dict).get("participant")[0]
+    first_rows = pheno_df.drop_duplicates(subset=participants)
+    # Use a few groups per process so that a slow group does not hold up the others
+    group_size = max(1, math.ceil(len(first_rows) / (4 * jobs)))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for group_subject_dicts in executor.map(
+            partial(_create_subject_dicts, data_dict),
+            (
+                first_rows.iloc[start : start + group_size]
+                for start in range(0, len(first_rows), group_size)
+            ),
+        ):
+            yield from group_subject_dicts
+
+
+def create_dataset_dict(
+    data_dict: dict, pheno_df: pd.DataFrame, name: str, jobs: int = 1
+) -> dict:
+    """
+    Returns the serialized Dataset that create_dataset() would create.
+    See iter_subject_dicts() for the jobs option.
+    """
+    dataset_dict = models.model_to_dict(
+        models.Dataset(label=name, hasSamples=[])
+    )
+    dataset_dict["hasSamples"] = list(
+        iter_subject_dicts(data_dict, pheno_df, jobs=jobs)
+    )
+    return dataset_dict
+
+
+def _count_terms(terms: pd.Series) -> dict:
+    """Counts the subjects with each term, given one term, a list of terms or None per subject."""
+    # Categorical values are counted as objects, so that unused categories are not counted
+    term_counts = (
+        terms.astype(object).explode().dropna().value_counts().sort_index()
+    )
+    return {term: int(count) for term, count in term_counts.items()}
+
+
+def _summarize_ages(ages: pd.Series) -> dict:
+    """Returns the number of subjects with an age, the quartiles and range of their ages and their histogram."""
+    ages = pd.to_numeric(ages, errors="coerce").dropna()
+    if ages.empty:
+        return {"n_subjects": 0}
+
+    bin_counts = (
+        (ages // AGE_HISTOGRAM_BIN_WIDTH * AGE_HISTOGRAM_BIN_WIDTH)
+        .astype(int)
+        .value_counts()
+        .sort_index()
+    )
+    return {
+        "n_subjects": len(ages),
+        **{
+            statistic: round(float(value), 3)
+            for statistic, value in [
+                ("min", ages.min()),
+                ("q1", ages.quantile(0.25)),
+                ("median", ages.median()),
+                ("q3", ages.quantile(0.75)),
+                ("max", ages.max()),
+                ("mean", ages.mean()),
+            ]
+        },
+        "histogram": [
+            {
+                "min": int(bin_start),
+                "max": int(bin_start) + AGE_HISTOGRAM_BIN_WIDTH,
+                "n_subjects": int(count),
+            }
+            for bin_start, count in bin_counts.items()
+        ],
+    }
+
+
+def summarize_pheno(data_dict: dict, pheno_df: pd.DataFrame) -> dict:
+    """
+    Returns the summary statistics of the subjects that iter_subjects() would create from a validated
+    phenotypic file: the number of subjects, the number of subjects per sex, diagnosis, subject group and
+    assessment tool, and the distribution of ages. The statistics are computed directly from the
+    first row of each participant, column by column, following the same rules as create_subject().
+    """
+    column_mapping = map_categories_to_columns(data_dict)
+    tool_mapping = map_tools_to_columns(data_dict)
+    first_rows = pheno_df.drop_duplicates(
+        subset=column_mapping.get("participant")[0]
+    )
+
+    def get_missing_mask(column: str) -> pd.Series:
+        return first_rows[column].isin(
+            data_dict[column]["Annotations"].get("MissingValues", [])
+        )
+
+    def get_terms(category: str) -> pd.Series:
+        # Like get_transformed_values(), only the first column of each category is used
+        if category not in column_mapping:
+            return pd.Series(dtype=object)
+        column = column_mapping[category][0]
+        levels = data_dict[column]["Annotations"]["Levels"]
+        return (
+            first_rows[column]
+            .map({value: level["TermURL"] for value, level in levels.items()})
+            .mask(get_missing_mask(column))
+        )
+
+    ages = pd.Series(dtype=float)
+    if "age" in column_mapping:
+        age_column = column_mapping["age"][0]
+        heuristic = get_age_heuristic(age_column, data_dict)
+        present_ages = first_rows[age_column][~get_missing_mask(age_column)]
+        # Age values tend to repeat, so each unique value is only transformed once
+        ages = present_ages.map(
+            {
+                value: transform_age(str(value), heuristic)
+                for value in present_ages.unique()
+            }
+        ).astype(float)
+
+    diagnoses = get_terms("diagnosis")
+    is_healthy_control = diagnoses == mappings.NEUROBAGEL["healthy_control"]
+    # Like are_not_missing(), a tool is only available if none of its columns is missing
+    n_assessed_subjects = {
+        tool: int(
+            pd.concat(
+                [~get_missing_mask(column) for column in columns], axis=1
+            )
+            .all(axis=1)
+            .sum()
+        )
+        for tool, columns in tool_mapping.items()
+    }
+
+    return {
+        "n_subjects": len(first_rows),
+        "sex": _count_terms(get_terms("sex")),
+        "diagnosis": _count_terms(diagnoses[~is_healthy_control]),
+        "subject_group": _count_terms(diagnoses[is_healthy_control]),
+        "assessment": {
+            tool: n_subjects
+            for tool, n_subjects in sorted(n_assessed_subjects.items())
+            if n_subjects > 0
+        },
+        "age": _summarize_ages(ages),
+    }
+
+
+def summarize_subject_dicts(subject_dicts: Iterable[dict]) -> dict:
+    """
+    Returns the same summary statistics as summarize_pheno() for serialized subjects (e.g. read back from
+    a .jsonld file), together with the number of subjects with imaging sessions, the total number of imaging
+    sessions and the number of subjects with at least one acquisition of each image contrast type.
+    """
+    subjects = pd.DataFrame.from_records(
+        [
+            {
+                "sex": subject.get("sex", {}).get("identifier"),
+                "diagnosis": [
+                    term["identifier"] for term in subject.get("diagnosis", [])
+                ],
+                "subject_group": subject.get("isSubjectGroup", {}).get(
+                    "identifier"
+                ),
+                "assessment": [
+                    term["identifier"]
+                    for term in subject.get("assessment", [])
+                ],
+                "age": subject.get("age"),
+                "n_sessions": len(subject.get("hasSession", [])),
+                "image_contrast": list(
+                    {
+                        acquisition["hasContrastType"]["identifier"]
+                        for session in subject.get("hasSession", [])
+                        for acquisition in session["hasAcquisition"]
+                    }
+                ),
+            }
+            for subject in subject_dicts
+        ],
+        columns=[
+            "sex",
+            "diagnosis",
+            "subject_group",
+            "assessment",
+            "age",
+            "n_sessions",
+            "image_contrast",
+        ],
+    )
+
+    return {
+        "n_subjects": len(subjects),
+        "sex": _count_terms(subjects["sex"]),
+        "diagnosis": _count_terms(subjects["diagnosis"]),
+        "subject_group": _count_terms(subjects["subject_group"]),
+        "assessment": _count_terms(subjects["assessment"]),
+        "age": _summarize_ages(subjects["age"]),
+        "n_subjects_with_imaging": int((subjects["n_sessions"] > 0).sum()),
+        "n_imaging_sessions": int(subjects["n_sessions"].sum()),
+        "image_contrast": _count_terms(subjects["image_contrast"]),
+    }
+
+
+def read_pheno_file(
+    pheno: Path, data_dict: dict, engine: CSVEngine = CSVEngine.c
+) -> pd.DataFrame:
+    """
+    Reads the columns of a phenotypic .tsv file that are annotated in its data dictionary,
+    as categorical columns of the values as they are in the file (i.e. missing values are not
+    interpreted). Columns that are not annotated are never used, so they are skipped while parsing,
+    and values tend to repeat (e.g. levels, ages and session IDs), so storing each unique value of
+    a column only once uses much less memory than one string object per value.
+
+    The pyarrow engine parses the file with multiple threads, but requires the optional
+    pyarrow package.
+    """
+    header = pd.read_csv(pheno, sep="\t", nrows=0).columns
+    columns = [column for column in header if column in data_dict]
+
+    if engine == CSVEngine.pyarrow:
+        try:
+            import pyarrow as pa
+            from pyarrow import csv as pa_csv
+        except ImportError as e:
+            raise ImportError(
+                "The pyarrow CSV engine requires the pyarrow package. "
+                "Please install it (e.g. pip install pyarrow) or use the c engine."
+            ) from e
+        # Pandas' own pyarrow engine infers column types, which would e.g. turn "007" into 7
+        return pa_csv.read_csv(
+            pheno,
+            parse_options=pa_csv.ParseOptions(delimiter="\t"),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={
+                    column: pa.dictionary(pa.int32(), pa.string())
+                    for column in columns
+                },
+                null_values=[],
+                strings_can_be_null=False,
+                quoted_strings_can_be_null=False,
+            ),
+        ).to_pandas()
+
+    return pd.read_csv(
+        pheno,
+        sep="\t",
+        usecols=columns,
+        keep_default_na=False,
+        dtype="category",
+    )
+
+
+def read_pheno_inputs(
+    pheno: Path, dictionary: Path, engine: CSVEngine = CSVEngine.c
+) -> tuple:
+    """
+    Reads a phenotypic .tsv file and its data dictionary, and returns them
+    after checking that they are valid.
+    """
+    data_dictionary = load_json(dictionary)
+    pheno_df = read_pheno_file(pheno, data_dictionary, engine)
+    mutil.current_run().add("rows_read", len(pheno_df))
+    validate_inputs(data_dictionary, pheno_df)
+
+    return data_dictionary, pheno_df
+
+
+def merge_pheno_inputs(inputs: Iterable[tuple]) -> tuple:
+    """
+    Joins several validated phenotypic files (e.g. one per instrument), each given as a
+    (data dictionary, DataFrame) pair, on their participant ID columns, and returns the combined
+    data dictionary and DataFrame.
+
+    Subjects are only created from the first row of each participant, so each file is reduced to
+    that row and to its annotated columns before it is joined, and the joined DataFrame has one row
+    per participant. Participants are in the order they first appear in the first file, followed by
+    those only found in later files. The participant ID column of later files is renamed to that of
+    the first file, and their session ID columns are dropped. Values of participants that are missing
+    from a file are set to "", which is added to the missing values of the affected columns.
+    """
+    merged_dict = {}
+    merged_df = None
+    for data_dict, pheno_df in inputs:
+        column_mapping = map_categories_to_columns(data_dict)
+        if "participant" not in column_mapping:
+            raise LookupError(
+                "To combine several phenotypic files, every data dictionary must have a column "
+                "annotated as participant ID."
+            )
+        participants = column_mapping["participant"][0]
+        pheno_df = pheno_df.drop_duplicates(subset=participants)[
+            list(data_dict.keys())
+        ]
+        if merged_df is None:
+            merged_participants = participants
+            merged_dict.update(data_dict)
+            merged_df = pheno_df
+            continue
+
+        id_columns = [participants] + column_mapping.get("session", [])
+        pheno_df = pheno_df.drop(
+            columns=column_mapping.get("session", [])
+        ).rename(columns={participants: merged_participants})
+        shared_columns = set(pheno_df.columns).intersection(
+            merged_df.columns
+        ) - {merged_participants}
+        if shared_columns:
+            raise ValueError(
+                f"The column(s) {sorted(shared_columns)} are found in more than one of the provided "
+                "phenotypic files. Please make sure that, apart from participant and session IDs, "
+                "each column is only found in one phenotypic file."
+            )
+        merged_dict.update(
+            {
+                col: attr
+                for col, attr in data_dict.items()
+                if col not in id_columns
+            }
+        )
+        # A left join keeps the order of the participants, then participants not seen before are appended
+        merged_df = pd.concat(
+            [
+                merged_df.merge(pheno_df, on=merged_participants, how="left"),
+                pheno_df[
+                    ~pheno_df[merged_participants].isin(
+                        merged_df[merged_participants]
+                    )
+                ],
+            ],
+            ignore_index=True,
+        )
+
+    for col in merged_df.columns[merged_df.isna().any()]:
+        values = merged_df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype) and (
+            "" not in values.cat.categories
+        ):
+            values = values.cat.add_categories("")
+        merged_df[col] = values.fillna("")
+        annotations = merged_dict[col]["Annotations"]
+        merged_dict[col] = {
+            **merged_dict[col],
+            "Annotations": {
+                **annotations,
+                "MissingValues": annotations.get("MissingValues", []) + [""],
+            },
+        }
+
+    return merged_dict, merged_df
+
+
+def read_merged_pheno_inputs(
+    phenos: list, dictionaries: list, engine: CSVEngine = CSVEngine.c
+) -> tuple:
+    """
+    Reads and validates one or more phenotypic .tsv files, each with its own data dictionary,
+    and returns the combined data dictionary and DataFrame (see merge_pheno_inputs()).
+    """
+    if len(phenos) != len(dictionaries):
+        raise ValueError(
+            f"{len(phenos)} phenotypic file(s) and {len(dictionaries)} data dictionary(ies) were provided. "
+            "Please provide exactly one data dictionary for each phenotypic file, in the same order."
+        )
+    if len(phenos) == 1:
+        return read_pheno_inputs(phenos[0], dictionaries[0], engine)
+
+    # Each file is reduced as soon as it is read, so only one full file is in memory at a time
+    return merge_pheno_inputs(
+        read_pheno_inputs(pheno, dictionary, engine)
+        for pheno, dictionary in zip(phenos, dictionaries)
+    )
+
+
+def load_pheno_dataset(
+    phenos: list,
+    dictionaries: list,
+    name: str,
+    engine: CSVEngine = CSVEngine.c,
+) -> models.Dataset:
+    """
+    Reads and validates one or more phenotypic .tsv files, each with its own data dictionary
+    (see read_merged_pheno_inputs()), and returns the corresponding Dataset object.
+    """
+    run_metrics = mutil.current_run()
+    with run_metrics.stage("read"):
+        data_dictionary, pheno_df = read_merged_pheno_inputs(
+            phenos, dictionaries, engine
+        )
+    with run_metrics.stage("build"):
+        dataset = create_dataset(data_dictionary, pheno_df, name)
+    run_metrics.add("subjects_built", len(dataset.hasSamples))
+
+    return dataset
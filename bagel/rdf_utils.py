@@ -0,0 +1,111 @@
+import json
+from typing import IO, Iterable
+from urllib.parse import quote
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+XSD = "http://www.w3.org/2001/XMLSchema#"
+# Characters that may appear in an N-Triples IRI as they are, all others are percent-encoded
+IRI_SAFE_CHARACTERS = ":/?#[]@!$&'()*+,;=%~"
+
+
+def expand_iri(term: str, prefixes: dict) -> str:
+    """
+    Expands a compact IRI (e.g. bg:Subject) using the prefixes of a JSON-LD context.
+    Terms with an unknown prefix are returned as they are, like a JSON-LD processor would.
+    """
+    prefix, separator, suffix = term.partition(":")
+    if separator and isinstance(prefixes.get(prefix), str):
+        return prefixes[prefix] + suffix
+    return term
+
+
+def format_literal(value) -> str:
+    """Formats a JSON value as an N-Triples literal, typed the same way as in JSON-LD."""
+    if isinstance(value, bool):
+        return f'"{str(value).lower()}"^^<{XSD}boolean>'
+    if isinstance(value, int):
+        return f'"{value}"^^<{XSD}integer>'
+    if isinstance(value, float):
+        return f'"{value!r}"^^<{XSD}double>'
+    # The escape sequences of JSON strings are also valid in N-Triples literals
+    return json.dumps(str(value))
+
+
+class RDFWriter:
+    """
+    Writes serialized models (see models.model_to_dict()) as N-Triples statements, or as N-Quads
+    statements in the named graph of the dataset, one line at a time.
+    """
+
+    def __init__(self, f: IO[str], context: dict, named_graph: bool = False):
+        self.f = f
+        self.context = context["@context"]
+        self.named_graph = named_graph
+        self._graph = ""
+        # Controlled terms are shared by many subjects, so their statements are only written once
+        self._written_terms = set()
+
+    def _iri(self, term: str) -> str:
+        return f"<{quote(expand_iri(term, self.context), safe=IRI_SAFE_CHARACTERS)}>"
+
+    def _type_iri(self, schema_key: str) -> str:
+        # Types that are not defined in the context (e.g. of controlled terms) are in the bg: namespace
+        type_term = self.context.get(schema_key)
+        return self._iri(
+            type_term if isinstance(type_term, str) else f"bg:{schema_key}"
+        )
+
+    def _property_iri(self, name: str) -> str:
+        return self._iri(self.context[name]["@id"])
+
+    def write_statement(self, subject: str, predicate: str, obj: str):
+        self.f.write(f"{subject} {predicate} {obj}{self._graph} .\n")
+
+    def write_node(self, node: dict) -> str:
+        """Writes the statements of a node and of all nodes nested in it, and returns the IRI of the node."""
+        node_iri = self._iri(node["identifier"])
+        if node.keys() <= {"identifier", "schemaKey"}:
+            if node_iri in self._written_terms:
+                return node_iri
+            self._written_terms.add(node_iri)
+
+        for name, value in node.items():
+            if name == "identifier":
+                continue
+            if name == "schemaKey":
+                self.write_statement(
+                    node_iri, f"<{RDF_TYPE}>", self._type_iri(value)
+                )
+                continue
+            for item in value if isinstance(value, list) else [value]:
+                self.write_statement(
+                    node_iri,
+                    self._property_iri(name),
+                    self.write_node(item)
+                    if isinstance(item, dict)
+                    else format_literal(item),
+                )
+
+        return node_iri
+
+    def write_dataset(self, dataset_fields: dict, subjects: Iterable[dict]):
+        """
+        Writes the statements of a dataset, given its fields other than hasSamples,
+        and of its subjects, which are consumed one at a time.
+        """
+        dataset_iri = self._iri(dataset_fields["identifier"])
+        if self.named_graph:
+            self._graph = f" {dataset_iri}"
+
+        self.write_node(
+            {
+                name: value
+                for name, value in dataset_fields.items()
+                if name != "hasSamples"
+            }
+        )
+        has_samples = self._property_iri("hasSamples")
+        for subject in subjects:
+            self.write_statement(
+                dataset_iri, has_samples, self.write_node(subject)
+            )
@@ -35,6 +35,22 @@ def load_test_json():
     return _read_file
 
 
+@pytest.fixture(scope="session")
+def parse_metrics():
+    """Returns the samples of an OpenMetrics text file as a dict of {sample name with labels: value}."""
+
+    def _parse_file(metrics_p):
+        lines = metrics_p.read_text().splitlines()
+        assert lines[-1] == "# EOF"
+        return {
+            line.rpartition(" ")[0]: float(line.rpartition(" ")[2])
+            for line in lines
+            if not line.startswith("#")
+        }
+
+    return _parse_file
+
+
 @pytest.fixture(scope="session")
 def bids_invalid_synthetic(bids_path, bids_synthetic, tmp_path_factory):
     invalid_path = tmp_path_factory.mktemp("tmp_bids") / "synthetic_invalid"
@@ -0,0 +1,124 @@
+import pytest
+
+from bagel.cli import bagel
+
+
+@pytest.fixture
+def write_manifest(tmp_path):
+    def _write_manifest(rows):
+        manifest = tmp_path / "manifest.tsv"
+        lines = ["jsonld_path\tbids_dir\toutput"] + [
+            "\t".join(str(path) for path in row) for row in rows
+        ]
+        manifest.write_text("\n".join(lines) + "\n")
+        return manifest
+
+    return _write_manifest
+
+
+def test_batch_isolates_failing_datasets(
+    runner,
+    test_data,
+    bids_synthetic,
+    bids_invalid_synthetic,
+    tmp_path,
+    write_manifest,
+    load_test_json,
+):
+    """
+    Check that a dataset that fails to process is reported without stopping
+    the other datasets in the batch from being processed.
+    """
+    outputs = [tmp_path / "valid", tmp_path / "invalid"]
+    for output in outputs:
+        output.mkdir()
+    manifest = write_manifest(
+        [
+            (
+                test_data / "example_synthetic.jsonld",
+                bids_synthetic,
+                outputs[0],
+            ),
+            (
+                test_data / "example_synthetic.jsonld",
+                bids_invalid_synthetic,
+                outputs[1],
+            ),
+        ]
+    )
+
+    result = runner.invoke(
+        bagel,
+        [
+            "batch",
+            "--manifest",
+            manifest,
+            "--report",
+            tmp_path / "report.json",
+            "--jobs",
+            "2",
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert (outputs[0] / "pheno_bids.jsonld").exists()
+    assert not (outputs[1] / "pheno_bids.jsonld").exists()
+
+    report = load_test_json(tmp_path / "report.json")
+    assert report["n_datasets"] == 2
+    assert report["n_succeeded"] == 1
+    assert [dataset["status"] for dataset in report["datasets"]] == [
+        "success",
+        "failed",
+    ]
+    assert report["datasets"][0]["error"] is None
+    assert "BIDSValidationError" in report["datasets"][1]["error"]
+    assert report["datasets"][1]["bids_dir"] == str(bids_invalid_synthetic)
+
+
+def test_batch_terminates_datasets_that_time_out(
+    runner, test_data, bids_synthetic, tmp_path, write_manifest, load_test_json
+):
+    """Check that processing a dataset is stopped and reported once it exceeds the timeout."""
+    manifest = write_manifest(
+        [(test_data / "example_synthetic.jsonld", bids_synthetic, tmp_path)]
+    )
+
+    result = runner.invoke(
+        bagel,
+        [
+            "batch",
+            "--manifest",
+            manifest,
+            "--report",
+            tmp_path / "report.json",
+            "--timeout",
+            "0",
+        ],
+    )
+
+    assert result.exit_code == 1
+    assert not (tmp_path / "pheno_bids.jsonld").exists()
+    report = load_test_json(tmp_path / "report.json")
+    assert report["datasets"][0]["status"] == "timeout"
+
+
+def test_batch_manifest_without_required_columns_raises(runner, tmp_path):
+    """Check that a manifest missing one of the required columns is rejected with an informative error."""
+    manifest = tmp_path / "manifest.tsv"
+    manifest.write_text("jsonld_path\tbids_dir\n")
+
+    with pytest.raises(LookupError) as e:
+        runner.invoke(
+            bagel,
+            [
+                "batch",
+                "--manifest",
+                manifest,
+                "--report",
+                tmp_path / "report.json",
+            ],
+            catch_exceptions=False,
+        )
+
+    assert "missing the required column(s): ['output']" in str(e.value)
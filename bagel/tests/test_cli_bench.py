@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from bagel.cli import bagel
+
+
+@pytest.fixture
+def bench_args(tmp_path):
+    return [
+        "bench",
+        "--output",
+        tmp_path / "results.json",
+        "--repeats",
+        "2",
+        "--size",
+        "4",
+        "--bids-size",
+        "2",
+    ]
+
+
+def test_bench_saves_results(runner, bench_args, tmp_path, load_test_json):
+    """Check that every benchmark scenario is run and its timing and memory results are saved."""
+    result = runner.invoke(bagel, bench_args)
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    scenarios = load_test_json(tmp_path / "results.json")["scenarios"]
+    assert set(scenarios.keys()) == {
+        "pheno_4",
+        "validate_4",
+        "serialize_4",
+        "bids_2",
+        "bids_index_full_2",
+        "bids_index_minimal_2",
+    }
+    for scenario in scenarios.values():
+        assert 0 < scenario["median_s"] <= scenario["p95_s"]
+        assert scenario["peak_memory_mb"] > 0
+        assert scenario["repeats"] == 2
+
+
+@pytest.mark.parametrize(
+    "baseline_median, expected_exit_code", [(1e-9, 1), (1e3, 0)]
+)
+def test_bench_compares_against_baseline(
+    runner,
+    bench_args,
+    tmp_path,
+    load_test_json,
+    baseline_median,
+    expected_exit_code,
+):
+    """Check that scenarios slower than the baseline by more than the threshold are reported as regressions."""
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(
+        json.dumps(
+            {"scenarios": {"serialize_4": {"median_s": baseline_median}}}
+        )
+    )
+
+    result = runner.invoke(bagel, bench_args + ["--baseline", baseline])
+
+    assert result.exit_code == expected_exit_code
+    regressions = load_test_json(tmp_path / "results.json")["regressions"]
+    assert list(regressions.keys()) == (
+        ["serialize_4"] if expected_exit_code else []
+    )
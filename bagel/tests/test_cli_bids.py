@@ -1,5 +1,12 @@
+import gzip
+import json
+import lzma
+import shutil
 from pathlib import Path
 
+import pytest
+
+import bagel.bids_utils as butil
 from bagel.cli import bagel
 
 
@@ -83,3 +90,603 @@ def test_bids_data_with_sessions_have_correct_paths(
             assert ses["label"] in ses["filePath"]
             assert Path(ses["filePath"]).is_absolute()
             assert Path(ses["filePath"]).is_dir()
+
+
+def test_invalid_bids_dataset_only_runs_without_validation(
+    runner, test_data, bids_invalid_synthetic, tmp_path
+):
+    """
+    Check that an invalid BIDS dataset is rejected by default, but can still be
+    processed when BIDS validation is disabled.
+    """
+    args = [
+        "bids",
+        "--jsonld-path",
+        test_data / "example_synthetic.jsonld",
+        "--bids-dir",
+        bids_invalid_synthetic,
+        "--output",
+        tmp_path,
+    ]
+
+    result = runner.invoke(bagel, args)
+    assert result.exit_code != 0
+    assert not (tmp_path / "pheno_bids.jsonld").exists()
+
+    result = runner.invoke(bagel, args + ["--no-validate"])
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert (tmp_path / "pheno_bids.jsonld").exists()
+
+
+def test_bids_validation_cache_is_reused(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json, monkeypatch
+):
+    """
+    Check that a successfully validated dataset is recorded in the validation cache,
+    and that it is not validated again on the next run.
+    """
+    cache = tmp_path / "validation_cache.json"
+    args = [
+        "bids",
+        "--jsonld-path",
+        test_data / "example_synthetic.jsonld",
+        "--bids-dir",
+        bids_synthetic,
+        "--output",
+        tmp_path,
+        "--validation-cache",
+        cache,
+    ]
+
+    result = runner.invoke(bagel, args)
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert list(load_test_json(cache).values()) == [
+        bids_synthetic.absolute().as_posix()
+    ]
+
+    layout_validate_args = []
+    original_layout = butil.BIDSLayout
+
+    def spy_layout(root, validate=True, **kwargs):
+        layout_validate_args.append(validate)
+        return original_layout(root, validate=validate, **kwargs)
+
+    monkeypatch.setattr(butil, "BIDSLayout", spy_layout)
+    result = runner.invoke(bagel, args)
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert layout_validate_args == [False]
+
+
+def test_streamed_bids_output_matches_default_output(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json
+):
+    """
+    Check that streaming the phenotypic subjects produces the same output as loading the
+    whole phenotypic .jsonld file, apart from the randomly generated session and acquisition IDs.
+    """
+
+    def strip_imaging_ids(pheno_bids):
+        for sub in pheno_bids["hasSamples"]:
+            for ses in sub.get("hasSession", []):
+                ses.pop("identifier")
+                for acq in ses["hasAcquisition"]:
+                    acq.pop("identifier")
+        return pheno_bids
+
+    outputs = []
+    for mode_args in [[], ["--stream"]]:
+        output = tmp_path / f"output{len(outputs)}"
+        output.mkdir()
+        result = runner.invoke(
+            bagel,
+            [
+                "bids",
+                "--jsonld-path",
+                test_data / "example_synthetic.jsonld",
+                "--bids-dir",
+                bids_synthetic,
+                "--output",
+                output,
+            ]
+            + mode_args,
+        )
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+        outputs.append(
+            strip_imaging_ids(load_test_json(output / "pheno_bids.jsonld"))
+        )
+
+    assert outputs[0] == outputs[1]
+    assert not (tmp_path / "output1" / "pheno_bids.jsonld.part").exists()
+
+
+def test_minimal_index_output_matches_full_index_output(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json
+):
+    """
+    Check that indexing only the image files of the BIDS dataset produces the same output as
+    indexing it with the full pybids configuration, apart from the randomly generated IDs.
+    """
+    outputs = []
+    for index_args in [["--minimal-index"], ["--no-minimal-index"]]:
+        output = tmp_path / f"output{len(outputs)}"
+        output.mkdir()
+        result = runner.invoke(
+            bagel,
+            [
+                "bids",
+                "--jsonld-path",
+                test_data / "example_synthetic.jsonld",
+                "--bids-dir",
+                bids_synthetic,
+                "--output",
+                output,
+                "--aggregate-acquisitions",
+                "--count-runs",
+            ]
+            + index_args,
+        )
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+        outputs.append(
+            [
+                [
+                    (
+                        ses["label"],
+                        ses["filePath"],
+                        [
+                            (
+                                acq["hasContrastType"]["identifier"],
+                                acq["numberOfRuns"],
+                            )
+                            for acq in ses["hasAcquisition"]
+                        ],
+                    )
+                    for ses in sub.get("hasSession", [])
+                ]
+                for sub in load_test_json(output / "pheno_bids.jsonld")[
+                    "hasSamples"
+                ]
+            ]
+        )
+
+    assert outputs[0] == outputs[1]
+
+
+def test_delta_output_only_contains_imaging_data(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json
+):
+    """
+    Check that the delta output links sessions to the subject IDs of the phenotypic .jsonld file,
+    without repeating any phenotypic data.
+    """
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            test_data / "example_synthetic.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--delta",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert not (tmp_path / "pheno_bids.jsonld").exists()
+
+    pheno = load_test_json(test_data / "example_synthetic.jsonld")
+    bids_delta = load_test_json(tmp_path / "bids_delta.jsonld")
+
+    assert bids_delta["@context"]["identifier"] == "@id"
+    assert [sub["identifier"] for sub in bids_delta["@graph"]] == [
+        sub["identifier"] for sub in pheno["hasSamples"]
+    ]
+    for sub in bids_delta["@graph"]:
+        assert set(sub.keys()) == {"identifier", "hasSession"}
+        assert ["ses-01", "ses-02"] == [
+            ses["label"] for ses in sub["hasSession"]
+        ]
+
+
+def test_aggregated_acquisitions_are_not_repeated(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json
+):
+    """Check that aggregated sessions contain each contrast type only once, with its run count."""
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            test_data / "example_synthetic.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--aggregate-acquisitions",
+            "--count-runs",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    pheno_bids = load_test_json(tmp_path / "pheno_bids.jsonld")
+    for sub in pheno_bids["hasSamples"]:
+        for ses in sub["hasSession"]:
+            contrast_types = [
+                acq["hasContrastType"]["identifier"]
+                for acq in ses["hasAcquisition"]
+            ]
+            assert len(contrast_types) == len(set(contrast_types))
+            assert (
+                sum(acq["numberOfRuns"] for acq in ses["hasAcquisition"]) == 4
+            )
+
+
+@pytest.mark.parametrize("stream_args", [[], ["--stream"]])
+def test_bids_reads_and_writes_compressed_jsonld(
+    runner, test_data, bids_synthetic, tmp_path, stream_args
+):
+    """Check that a compressed phenotypic .jsonld file is read transparently, and that the output can be compressed."""
+    compressed_jsonld = tmp_path / "pheno.jsonld.gz"
+    with gzip.open(compressed_jsonld, "wt") as f:
+        f.write((test_data / "example_synthetic.jsonld").read_text())
+
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            compressed_jsonld,
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--compression",
+            "xz",
+        ]
+        + stream_args,
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert not (tmp_path / "pheno_bids.jsonld").exists()
+
+    with lzma.open(tmp_path / "pheno_bids.jsonld.xz", "rt") as f:
+        pheno_bids = json.load(f)
+
+    for sub in pheno_bids["hasSamples"]:
+        assert ["ses-01", "ses-02"] == [
+            ses["label"] for ses in sub["hasSession"]
+        ]
+
+
+def test_bids_run_is_not_skipped_after_bids_dataset_changes(
+    runner, test_data, bids_synthetic, tmp_path
+):
+    """Check that an otherwise unchanged run is not skipped once a file is added to the BIDS directory."""
+    bids_copy = tmp_path / "synthetic"
+    shutil.copytree(bids_synthetic, bids_copy)
+    output = tmp_path / "output"
+    output.mkdir()
+    args = [
+        "bids",
+        "--jsonld-path",
+        test_data / "example_synthetic.jsonld",
+        "--bids-dir",
+        bids_copy,
+        "--output",
+        output,
+        "--skip-if-unchanged",
+    ]
+
+    for expect_skip in [False, True]:
+        result = runner.invoke(bagel, args)
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+        assert ("Skipping" in result.output) == expect_skip
+
+    (
+        bids_copy / "sub-01" / "ses-01" / "anat" / "sub-01_ses-01_T2w.nii"
+    ).touch()
+    result = runner.invoke(bagel, args)
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert "Skipping" not in result.output
+
+
+def test_bids_run_metrics_count_sessions_and_acquisitions(
+    runner, test_data, bids_synthetic, parse_metrics, tmp_path
+):
+    """Check that the metrics of a bids run match its output, and are labelled with the BIDS dataset name."""
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            test_data / "example_synthetic.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--metrics-file",
+            tmp_path / "bagel.prom",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    with open(tmp_path / "pheno_bids.jsonld", "r") as f:
+        sessions = [
+            session
+            for sub in json.load(f)["hasSamples"]
+            for session in sub.get("hasSession", [])
+        ]
+    labels = '{command="bids",dataset="Synthetic"}'
+    metrics = parse_metrics(tmp_path / "bagel.prom")
+    assert metrics[f"bagel_sessions_found{labels}"] == len(sessions)
+    assert metrics[f"bagel_acquisitions_found{labels}"] == sum(
+        len(session["hasAcquisition"]) for session in sessions
+    )
+    assert metrics[f"bagel_run_success{labels}"] == 1
+
+
+def test_interrupted_bids_run_can_be_resumed(
+    runner, test_data, bids_synthetic, load_test_json, tmp_path, monkeypatch
+):
+    """
+    Check that a run resumed from the checkpoint of an interrupted run only creates the sessions
+    of the subjects that were not processed yet, and has the same output as an uninterrupted run.
+    """
+    create_sessions = butil.create_sessions
+    processed_subjects = []
+
+    def create_sessions_until_interrupted(bids_sub_id, **kwargs):
+        if len(processed_subjects) == 2:
+            raise KeyboardInterrupt
+        processed_subjects.append(bids_sub_id)
+        return create_sessions(bids_sub_id=bids_sub_id, **kwargs)
+
+    def run_bids(output, *options):
+        output.mkdir(exist_ok=True)
+        return runner.invoke(
+            bagel,
+            [
+                "bids",
+                "--jsonld-path",
+                test_data / "example_synthetic.jsonld",
+                "--bids-dir",
+                bids_synthetic,
+                "--output",
+                output,
+                *options,
+            ],
+        )
+
+    result = run_bids(tmp_path / "expected")
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    output = tmp_path / "output"
+    with monkeypatch.context() as m:
+        m.setattr(butil, "create_sessions", create_sessions_until_interrupted)
+        result = run_bids(output, "--checkpoint", "--checkpoint-interval", "1")
+    assert result.exit_code != 0
+    assert (output / "bids.checkpoint").is_dir()
+    assert not (output / "pheno_bids.jsonld").exists()
+
+    interrupted_subjects = list(processed_subjects)
+    processed_subjects.clear()
+    monkeypatch.setattr(
+        butil,
+        "create_sessions",
+        lambda bids_sub_id, **kwargs: processed_subjects.append(bids_sub_id)
+        or create_sessions(bids_sub_id=bids_sub_id, **kwargs),
+    )
+    result = run_bids(output, "--resume")
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert "Resuming from the checkpoint" in result.output
+
+    assert not set(processed_subjects) & set(interrupted_subjects)
+    assert len(processed_subjects) + len(interrupted_subjects) == 5
+    assert not (output / "bids.checkpoint").exists()
+
+    def get_sessions(output):
+        return [
+            [
+                (
+                    ses["label"],
+                    ses["filePath"],
+                    [
+                        acq["hasContrastType"]["identifier"]
+                        for acq in ses["hasAcquisition"]
+                    ],
+                )
+                for ses in sub.get("hasSession", [])
+            ]
+            for sub in load_test_json(output / "pheno_bids.jsonld")[
+                "hasSamples"
+            ]
+        ]
+
+    assert get_sessions(output) == get_sessions(tmp_path / "expected")
+
+
+@pytest.mark.parametrize(
+    "aggregate_args, expected_repetition_times",
+    [
+        (
+            [],
+            {
+                ("nidm:T1Weighted", None),
+                ("nidm:FlowWeighted", 2.0),
+                ("nidm:FlowWeighted", 2.5),
+            },
+        ),
+        # The BOLD runs of a session have different repetition times, so none is shared by all of them
+        (
+            ["--aggregate-acquisitions"],
+            {("nidm:T1Weighted", None), ("nidm:FlowWeighted", None)},
+        ),
+    ],
+)
+def test_acquisition_metadata_is_added_from_sidecars(
+    runner,
+    test_data,
+    bids_synthetic,
+    load_test_json,
+    tmp_path,
+    aggregate_args,
+    expected_repetition_times,
+):
+    """Check that the repetition times of the inherited task sidecars are added to the acquisitions only if requested."""
+    for args, expected_values in [
+        (
+            aggregate_args,
+            {(term, None) for term, _ in expected_repetition_times},
+        ),
+        (
+            aggregate_args + ["--acquisition-metadata"],
+            expected_repetition_times,
+        ),
+    ]:
+        result = runner.invoke(
+            bagel,
+            [
+                "bids",
+                "--jsonld-path",
+                test_data / "example_synthetic.jsonld",
+                "--bids-dir",
+                bids_synthetic,
+                "--output",
+                tmp_path,
+            ]
+            + args,
+        )
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+        assert expected_values == {
+            (acq["hasContrastType"]["identifier"], acq.get("repetitionTime"))
+            for sub in load_test_json(tmp_path / "pheno_bids.jsonld")[
+                "hasSamples"
+            ]
+            for ses in sub.get("hasSession", [])
+            for acq in ses["hasAcquisition"]
+        }
+
+
+@pytest.mark.parametrize("stream_args", [[], ["--stream"]])
+@pytest.mark.parametrize(
+    "field_args, new_field",
+    [
+        (["--aggregate-acquisitions", "--count-runs"], "numberOfRuns"),
+        (["--acquisition-metadata"], "repetitionTime"),
+    ],
+)
+def test_new_fields_are_defined_in_the_context_of_older_inputs(
+    runner,
+    test_data,
+    bids_synthetic,
+    load_test_json,
+    tmp_path,
+    stream_args,
+    field_args,
+    new_field,
+):
+    """
+    Check that fields added since an input .jsonld file was created are defined in the @context
+    of the output, so that a JSON-LD processor does not drop them.
+    """
+
+    def get_properties(node):
+        if isinstance(node, list):
+            return set().union(*map(get_properties, node))
+        if isinstance(node, dict):
+            return set(node).union(*map(get_properties, node.values()))
+        return set()
+
+    input_context = load_test_json(test_data / "example_synthetic.jsonld")[
+        "@context"
+    ]
+    assert new_field not in input_context
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            test_data / "example_synthetic.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+        ]
+        + field_args
+        + stream_args,
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    pheno_bids = load_test_json(tmp_path / "pheno_bids.jsonld")
+    context = pheno_bids.pop("@context")
+    properties = get_properties(pheno_bids)
+    assert new_field in properties
+    assert properties <= context.keys()
+    assert all(context[term] == input_context[term] for term in input_context)
+
+
+@pytest.mark.parametrize(
+    "field_args, new_field",
+    [
+        (["--aggregate-acquisitions", "--count-runs"], "numberOfRuns"),
+        (["--acquisition-metadata"], "repetitionTime"),
+    ],
+)
+def test_new_fields_of_older_inputs_can_be_written_as_rdf_statements(
+    runner, test_data, bids_synthetic, tmp_path, field_args, new_field
+):
+    """Check that fields that the @context of an older input .jsonld file does not define are written as statements."""
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            test_data / "example_synthetic.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--format",
+            "nt",
+        ]
+        + field_args,
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    assert (
+        f"<http://neurobagel.org/vocab/{new_field}>"
+        in (tmp_path / "pheno_bids.nt").read_text()
+    )
+
+
+def test_summary_counts_imaging_sessions(
+    runner, test_data, bids_synthetic, load_test_json, tmp_path
+):
+    """Check that the summary sidecar counts the imaging sessions and contrast types of the output."""
+    result = runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            test_data / "example_synthetic.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--summary",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    subjects = load_test_json(tmp_path / "pheno_bids.jsonld")["hasSamples"]
+    summary = load_test_json(tmp_path / "pheno_bids_summary.json")
+    assert summary["n_subjects_with_imaging"] == sum(
+        "hasSession" in sub for sub in subjects
+    )
+    assert summary["n_imaging_sessions"] == sum(
+        len(sub.get("hasSession", [])) for sub in subjects
+    )
+    assert summary["image_contrast"] == {
+        "nidm:FlowWeighted": 5,
+        "nidm:T1Weighted": 5,
+    }
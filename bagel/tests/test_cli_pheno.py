@@ -1,3 +1,9 @@
+import gzip
+import json
+import lzma
+import shutil
+
+import pandas as pd
 import pytest
 
 from bagel.cli import bagel
@@ -287,3 +293,396 @@ def test_output_includes_context(runner, test_data, tmp_path, load_test_json):
     assert all(
         [sub.get("identifier") is not None for sub in pheno["hasSamples"]]
     )
+
+
+@pytest.mark.parametrize(
+    "compression, opener", [("gz", gzip.open), ("xz", lzma.open)]
+)
+def test_output_can_be_compressed(
+    runner, test_data, tmp_path, load_test_json, compression, opener
+):
+    """Check that the output is compressed and given the matching file extension when requested."""
+    result = runner.invoke(
+        bagel,
+        [
+            "pheno",
+            "--pheno",
+            test_data / "example2.tsv",
+            "--dictionary",
+            test_data / "example2.json",
+            "--output",
+            tmp_path,
+            "--name",
+            "my_dataset_name",
+            "--compression",
+            compression,
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert not (tmp_path / "pheno.jsonld").exists()
+
+    with opener(tmp_path / f"pheno.jsonld.{compression}", "rt") as f:
+        pheno = json.load(f)
+
+    assert pheno.get("label") == "my_dataset_name"
+
+
+@pytest.mark.parametrize("example", ["example2", "example_synthetic"])
+def test_parallel_output_matches_serial_output(
+    runner, test_data, tmp_path, load_test_json, example
+):
+    """
+    Check that creating the subjects in several processes produces the same output, in the same
+    participant order, as creating them in one process, apart from the randomly generated IDs.
+    """
+
+    def strip_ids(pheno):
+        pheno.pop("identifier")
+        for sub in pheno["hasSamples"]:
+            sub.pop("identifier")
+        return pheno
+
+    outputs = []
+    for jobs in ["1", "3"]:
+        output = tmp_path / f"jobs{jobs}"
+        output.mkdir()
+        result = runner.invoke(
+            bagel,
+            [
+                "pheno",
+                "--pheno",
+                test_data / f"{example}.tsv",
+                "--dictionary",
+                test_data / f"{example}.json",
+                "--output",
+                output,
+                "--name",
+                "my_dataset_name",
+                "--jobs",
+                jobs,
+            ],
+        )
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+        outputs.append(strip_ids(load_test_json(output / "pheno.jsonld")))
+
+    assert outputs[0] == outputs[1]
+
+
+@pytest.mark.parametrize(
+    "shard_args, expected_n_shards",
+    [
+        (["--shards", "3"], 3),
+        (["--shard-size", "2"], 3),
+        (["--shard-size", "4"], 2),
+        (["--shards", "3", "--jobs", "2"], 3),
+    ],
+)
+def test_output_can_be_sharded(
+    runner, test_data, tmp_path, load_test_json, shard_args, expected_n_shards
+):
+    """
+    Check that sharded outputs are self-contained documents that reference the same dataset,
+    contain all subjects in order between them, and are listed in the manifest.
+    """
+    pheno_args = [
+        "pheno",
+        "--pheno",
+        test_data / "example_synthetic.tsv",
+        "--dictionary",
+        test_data / "example_synthetic.json",
+        "--name",
+        "my_dataset_name",
+        "--output",
+    ]
+    (tmp_path / "single").mkdir()
+    (tmp_path / "sharded").mkdir()
+    result = runner.invoke(bagel, pheno_args + [tmp_path / "single"])
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    result = runner.invoke(
+        bagel, pheno_args + [tmp_path / "sharded"] + shard_args
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    manifest = load_test_json(tmp_path / "sharded" / "pheno_manifest.json")
+    shards = [
+        load_test_json(tmp_path / "sharded" / shard["path"])
+        for shard in manifest["shards"]
+    ]
+    pheno = load_test_json(tmp_path / "single" / "pheno.jsonld")
+
+    assert not (tmp_path / "sharded" / "pheno.jsonld").exists()
+    assert len(shards) == expected_n_shards
+    assert manifest["n_subjects"] == len(pheno["hasSamples"])
+    for shard in shards:
+        assert shard["@context"] == pheno["@context"]
+        assert shard["identifier"] == manifest["dataset"]
+        assert shard["label"] == "my_dataset_name"
+    assert [
+        sub["label"] for shard in shards for sub in shard["hasSamples"]
+    ] == [sub["label"] for sub in pheno["hasSamples"]]
+
+
+@pytest.mark.parametrize("output_format, n_terms", [("nt", 3), ("nq", 4)])
+def test_output_can_be_written_as_rdf_statements(
+    runner, test_data, tmp_path, output_format, n_terms
+):
+    """Check that N-Triples and N-Quads outputs have one statement per line, linking every subject to the dataset."""
+    result = runner.invoke(
+        bagel,
+        [
+            "pheno",
+            "--pheno",
+            test_data / "example_synthetic.tsv",
+            "--dictionary",
+            test_data / "example_synthetic.json",
+            "--output",
+            tmp_path,
+            "--name",
+            "my_dataset_name",
+            "--format",
+            output_format,
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert not (tmp_path / "pheno.jsonld").exists()
+
+    statements = (tmp_path / f"pheno.{output_format}").read_text().splitlines()
+    assert all(
+        len(statement.removesuffix(" .").split(" ")) == n_terms
+        for statement in statements
+    )
+    assert (
+        sum(
+            " <http://neurobagel.org/vocab/hasSamples> " in statement
+            for statement in statements
+        )
+        == 5
+    )
+
+
+def test_unchanged_runs_are_skipped(runner, test_data, tmp_path):
+    """
+    Check that a run is skipped when requested if the inputs, options and outputs are unchanged
+    since the last run, and that it is not skipped once an input, an option or an output has changed.
+    """
+    shutil.copy(test_data / "example2.tsv", tmp_path / "pheno.tsv")
+    shutil.copy(test_data / "example2.json", tmp_path / "pheno.json")
+    output = tmp_path / "output"
+    output.mkdir()
+
+    def run_pheno(name):
+        """Runs the pheno command and returns whether it was run rather than skipped."""
+        result = runner.invoke(
+            bagel,
+            [
+                "pheno",
+                "--pheno",
+                tmp_path / "pheno.tsv",
+                "--dictionary",
+                tmp_path / "pheno.json",
+                "--output",
+                output,
+                "--name",
+                name,
+                "--skip-if-unchanged",
+            ],
+        )
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+        assert (output / "pheno.jsonld").exists()
+        return "Skipping" not in result.output
+
+    assert run_pheno("my_dataset_name")
+    assert (output / "pheno.fingerprint.json").exists()
+    assert not run_pheno("my_dataset_name")
+
+    (output / "pheno.jsonld").unlink()
+    assert run_pheno("my_dataset_name")
+
+    (output / "pheno.jsonld").write_text("{}")
+    assert run_pheno("my_dataset_name")
+    assert not run_pheno("my_dataset_name")
+
+    assert run_pheno("my_other_dataset_name")
+
+    with open(tmp_path / "pheno.tsv", "a") as f:
+        f.write("\n")
+    assert run_pheno("my_other_dataset_name")
+
+
+def test_multiple_phenotypic_files_are_joined_on_participant_id(
+    runner, test_data, tmp_path, load_test_json
+):
+    """
+    Check that splitting a phenotypic file into several files, each with its own data dictionary,
+    participant ID column name and participant order, produces the same subjects as the original file.
+    """
+    pheno_df = pd.read_csv(
+        test_data / "example_synthetic.tsv",
+        sep="\t",
+        keep_default_na=False,
+        dtype=str,
+    )
+    data_dictionary = load_test_json(test_data / "example_synthetic.json")
+    demographic_columns = [
+        "participant_id",
+        "session_id",
+        "pheno_age",
+        "pheno_sex",
+        "pheno_group",
+    ]
+    tool_columns = ["session_id", "tool1_item1", "tool1_item2", "tool2_item1"]
+    split_args = []
+    for split_name, split_df, split_dictionary in [
+        (
+            "demographics",
+            pheno_df[demographic_columns],
+            {col: data_dictionary[col] for col in demographic_columns},
+        ),
+        (
+            "tools",
+            pheno_df[["participant_id"] + tool_columns]
+            .rename(columns={"participant_id": "subject"})
+            .sort_values("subject", ascending=False, kind="stable"),
+            {
+                "subject": data_dictionary["participant_id"],
+                **{col: data_dictionary[col] for col in tool_columns},
+            },
+        ),
+    ]:
+        split_df.to_csv(tmp_path / f"{split_name}.tsv", sep="\t", index=False)
+        (tmp_path / f"{split_name}.json").write_text(
+            json.dumps(split_dictionary)
+        )
+        split_args += [
+            "--pheno",
+            tmp_path / f"{split_name}.tsv",
+            "--dictionary",
+            tmp_path / f"{split_name}.json",
+        ]
+
+    outputs = []
+    for input_args in [
+        [
+            "--pheno",
+            test_data / "example_synthetic.tsv",
+            "--dictionary",
+            test_data / "example_synthetic.json",
+        ],
+        split_args,
+    ]:
+        output = tmp_path / f"output{len(outputs)}"
+        output.mkdir()
+        result = runner.invoke(
+            bagel,
+            ["pheno", "--output", output, "--name", "my_dataset_name"]
+            + input_args,
+        )
+        assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+        pheno = load_test_json(output / "pheno.jsonld")
+        outputs.append(
+            [
+                {key: val for key, val in sub.items() if key != "identifier"}
+                for sub in pheno["hasSamples"]
+            ]
+        )
+
+    assert outputs[0] == outputs[1]
+
+
+def test_run_metrics_are_written(runner, test_data, parse_metrics, tmp_path):
+    """Check that the metrics of a run are written to the metrics file, labelled with the dataset name."""
+    result = runner.invoke(
+        bagel,
+        [
+            "pheno",
+            "--pheno",
+            test_data / "example_synthetic.tsv",
+            "--dictionary",
+            test_data / "example_synthetic.json",
+            "--output",
+            tmp_path,
+            "--name",
+            "my_dataset_name",
+            "--metrics-file",
+            tmp_path / "bagel.prom",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    labels = '{command="pheno",dataset="my_dataset_name"'
+    metrics = parse_metrics(tmp_path / "bagel.prom")
+    assert metrics[f"bagel_rows_read{labels}}}"] == len(
+        pd.read_csv(test_data / "example_synthetic.tsv", sep="\t")
+    )
+    assert metrics[f"bagel_subjects_built{labels}}}"] == 5
+    assert (
+        metrics[f"bagel_bytes_written{labels}}}"]
+        == (tmp_path / "pheno.jsonld").stat().st_size
+    )
+    assert metrics[f"bagel_run_success{labels}}}"] == 1
+    for stage in ["read", "build", "write"]:
+        assert (
+            f'bagel_stage_duration_seconds{labels},stage="{stage}"}}'
+            in metrics
+        )
+
+
+def test_failed_run_metrics_are_written(
+    runner, test_data, parse_metrics, tmp_path
+):
+    """Check that the metrics of a run that fails are still written, and record the failure."""
+    result = runner.invoke(
+        bagel,
+        [
+            "pheno",
+            "--pheno",
+            test_data / "example2.tsv",
+            "--pheno",
+            test_data / "example2.tsv",
+            "--dictionary",
+            test_data / "example2.json",
+            "--output",
+            tmp_path,
+            "--name",
+            "my_dataset_name",
+            "--metrics-file",
+            tmp_path / "bagel.prom",
+        ],
+    )
+    assert result.exit_code != 0
+
+    metrics = parse_metrics(tmp_path / "bagel.prom")
+    assert (
+        metrics['bagel_run_success{command="pheno",dataset="my_dataset_name"}']
+        == 0
+    )
+
+
+def test_summary_references_the_dataset(runner, test_data, tmp_path):
+    """Check that the summary sidecar references the dataset of the output by its @id."""
+    result = runner.invoke(
+        bagel,
+        [
+            "pheno",
+            "--pheno",
+            test_data / "example_synthetic.tsv",
+            "--dictionary",
+            test_data / "example_synthetic.json",
+            "--output",
+            tmp_path,
+            "--name",
+            "my_dataset_name",
+            "--summary",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    with open(tmp_path / "pheno.jsonld", "r") as f:
+        pheno = json.load(f)
+    with open(tmp_path / "pheno_summary.json", "r") as f:
+        summary = json.load(f)
+    assert summary["dataset"] == pheno["identifier"]
+    assert summary["n_subjects"] == len(pheno["hasSamples"])
+    assert sum(summary["sex"].values()) == sum(
+        "sex" in sub for sub in pheno["hasSamples"]
+    )
@@ -0,0 +1,108 @@
+import bagel.bids_utils as butil
+import bagel.pheno_utils as putil
+from bagel import models
+from bagel.cli import bagel
+
+
+def strip_bagel_ids(node):
+    """Recursively removes the randomly generated identifiers of all graph nodes."""
+    if isinstance(node, list):
+        return [strip_bagel_ids(item) for item in node]
+    if isinstance(node, dict):
+        return {
+            key: strip_bagel_ids(value)
+            for key, value in node.items()
+            if not (key == "identifier" and value.startswith("bg:"))
+        }
+    return node
+
+
+def test_run_matches_pheno_followed_by_bids(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json
+):
+    """
+    Check that the combined run command produces the same output as running
+    the pheno and bids commands one after the other.
+    """
+    pheno_args = [
+        "--pheno",
+        test_data / "example_synthetic.tsv",
+        "--dictionary",
+        test_data / "example_synthetic.json",
+        "--name",
+        "do not care name",
+    ]
+    (tmp_path / "steps").mkdir()
+    (tmp_path / "run").mkdir()
+
+    runner.invoke(
+        bagel, ["pheno", "--output", tmp_path / "steps"] + pheno_args
+    )
+    runner.invoke(
+        bagel,
+        [
+            "bids",
+            "--jsonld-path",
+            tmp_path / "steps" / "pheno.jsonld",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path / "steps",
+        ],
+    )
+    result = runner.invoke(
+        bagel,
+        [
+            "run",
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path / "run",
+        ]
+        + pheno_args,
+    )
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert not (tmp_path / "run" / "pheno.jsonld").exists()
+    assert strip_bagel_ids(
+        load_test_json(tmp_path / "run" / "pheno_bids.jsonld")
+    ) == strip_bagel_ids(
+        load_test_json(tmp_path / "steps" / "pheno_bids.jsonld")
+    )
+
+
+def test_library_api_matches_run_command(
+    runner, test_data, bids_synthetic, tmp_path, load_test_json
+):
+    """
+    Check that creating a dataset with the library entry points of both sides
+    produces the same subjects as the run command.
+    """
+    phenos = [test_data / "example_synthetic.tsv"]
+    dictionaries = [test_data / "example_synthetic.json"]
+    result = runner.invoke(
+        bagel,
+        [
+            "run",
+            "--pheno",
+            phenos[0],
+            "--dictionary",
+            dictionaries[0],
+            "--bids-dir",
+            bids_synthetic,
+            "--output",
+            tmp_path,
+            "--name",
+            "my_dataset_name",
+        ],
+    )
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+
+    dataset = butil.add_bids_to_dataset(
+        putil.load_pheno_dataset(phenos, dictionaries, "my_dataset_name"),
+        bids_synthetic,
+    )
+
+    assert strip_bagel_ids(
+        load_test_json(tmp_path / "pheno_bids.jsonld")["hasSamples"]
+    ) == strip_bagel_ids(models.model_to_dict(dataset)["hasSamples"])
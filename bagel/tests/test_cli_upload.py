@@ -0,0 +1,170 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bagel.cli import bagel
+
+
+@pytest.fixture
+def graph_server():
+    """
+    A stand-in graph endpoint that records the JSON-LD documents POSTed to it.
+    Responses to upcoming requests can be overridden by adding status codes to `statuses`.
+    """
+
+    class GraphServer(ThreadingHTTPServer):
+        documents = []
+        statuses = []
+        lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            with self.server.lock:
+                status = (
+                    self.server.statuses.pop(0)
+                    if self.server.statuses
+                    else 204
+                )
+                if status < 300:
+                    self.server.documents.append(json.loads(body))
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = GraphServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get_upload_args(jsonld_path, server, *extra_args):
+    return [
+        "upload",
+        "--jsonld-path",
+        jsonld_path,
+        "--url",
+        f"http://127.0.0.1:{server.server_address[1]}/statements",
+        "--batch-size",
+        "2",
+        "--backoff",
+        "0",
+    ] + list(extra_args)
+
+
+def test_upload_sends_subjects_in_self_contained_batches(
+    runner, test_data, graph_server, load_test_json
+):
+    """Check that all subjects are uploaded in batches that each carry the @context and dataset fields."""
+    jsonld_path = test_data / "example_synthetic.jsonld"
+
+    result = runner.invoke(bagel, get_upload_args(jsonld_path, graph_server))
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    jsonld = load_test_json(jsonld_path)
+    assert len(graph_server.documents) == 3
+    for document in graph_server.documents:
+        assert document["@context"] == jsonld["@context"]
+        assert document["identifier"] == jsonld["identifier"]
+        assert 1 <= len(document["hasSamples"]) <= 2
+    assert sorted(
+        sub["label"]
+        for document in graph_server.documents
+        for sub in document["hasSamples"]
+    ) == [sub["label"] for sub in jsonld["hasSamples"]]
+
+
+def test_upload_retries_server_errors(runner, test_data, graph_server):
+    """Check that batches are retried after server errors, until they succeed."""
+    graph_server.statuses.extend([503, 500])
+
+    result = runner.invoke(
+        bagel,
+        get_upload_args(
+            test_data / "example_synthetic.jsonld",
+            graph_server,
+            "--jobs",
+            "1",
+        ),
+    )
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert len(graph_server.documents) == 3
+
+
+def test_upload_resumes_from_state(
+    runner, test_data, graph_server, tmp_path, load_test_json
+):
+    """
+    Check that batches that failed to upload are reported, and that rerunning the upload with
+    the same state file only uploads the batches that failed.
+    """
+    state = tmp_path / "upload_state.json"
+    args = get_upload_args(
+        test_data / "example_synthetic.jsonld",
+        graph_server,
+        "--jobs",
+        "1",
+        "--retries",
+        "0",
+        "--state",
+        state,
+    )
+    graph_server.statuses.extend([204, 503])
+
+    result = runner.invoke(bagel, args)
+
+    assert result.exit_code == 1
+    assert json.loads(result.stdout)["n_uploaded"] == 2
+    assert len(load_test_json(state)["completed"]) == 2
+
+    result = runner.invoke(bagel, args)
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    upload_report = json.loads(result.stdout)
+    assert upload_report["n_skipped"] == 2
+    assert upload_report["n_uploaded"] == 1
+    assert len(graph_server.documents) == 3
+
+
+@pytest.mark.parametrize("change", ["jsonld", "url"])
+def test_upload_state_is_not_reused_for_changed_files_or_urls(
+    runner, test_data, graph_server, tmp_path, load_test_json, change
+):
+    """
+    Check that rerunning an upload with the same state file uploads all batches again if the .jsonld
+    file was regenerated with different contents, or if the upload goes to a different url.
+    """
+    jsonld_path = tmp_path / "pheno.jsonld"
+    jsonld = load_test_json(test_data / "example_synthetic.jsonld")
+    jsonld_path.write_text(json.dumps(jsonld))
+    state = tmp_path / "upload_state.json"
+    args = get_upload_args(jsonld_path, graph_server, "--state", state)
+
+    result = runner.invoke(bagel, args)
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert json.loads(result.stdout)["n_uploaded"] == 3
+
+    if change == "jsonld":
+        jsonld["hasSamples"][0]["label"] = "sub-changed"
+        jsonld_path.write_text(json.dumps(jsonld))
+    else:
+        args[args.index("--url") + 1] += "?context=changed"
+
+    result = runner.invoke(bagel, args)
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    upload_report = json.loads(result.stdout)
+    assert upload_report["n_skipped"] == 0
+    assert upload_report["n_uploaded"] == 3
+    assert len(graph_server.documents) == 6
@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from bagel.cli import bagel
+
+
+@pytest.mark.parametrize("example", ["example2", "example6"])
+def test_validate_valid_inputs(runner, test_data, example):
+    """Check that valid inputs are reported as valid, without any errors."""
+    result = runner.invoke(
+        bagel,
+        [
+            "validate",
+            "--pheno",
+            test_data / f"{example}.tsv",
+            "--dictionary",
+            test_data / f"{example}.json",
+        ],
+    )
+
+    assert result.exit_code == 0, f"Errored out. STDOUT: {result.output}"
+    assert json.loads(result.stdout) == {
+        "valid": True,
+        "errors": [],
+        "warnings": [],
+    }
+
+
+@pytest.mark.parametrize(
+    "example, expected_error",
+    [
+        ("example3", "not a valid Neurobagel data dictionary"),
+        ("example7", "not compatible"),
+        ("example8", "more than one column"),
+        ("example9", "'group': ['UNANNOTATED']"),
+        ("example11", "missing values in participant or session id"),
+    ],
+)
+def test_validate_invalid_inputs(runner, test_data, example, expected_error):
+    """Check that invalid inputs are reported with the same errors that the pheno command raises."""
+    result = runner.invoke(
+        bagel,
+        [
+            "validate",
+            "--pheno",
+            test_data / f"{example}.tsv",
+            "--dictionary",
+            test_data / f"{example}.json",
+        ],
+    )
+
+    assert result.exit_code == 1
+    report = json.loads(result.stdout)
+    assert report["valid"] is False
+    assert any(
+        expected_error in error["message"] for error in report["errors"]
+    )
+
+
+def test_validate_reports_all_problems(runner, test_data, tmp_path):
+    """Check that every error and warning in the inputs is reported, not just the first one."""
+    pheno = tmp_path / "pheno.tsv"
+    pheno_rows = (test_data / "example9.tsv").read_text().splitlines()
+    # Remove a participant ID and all "missing" values of one column
+    pheno_rows[1] = pheno_rows[1].replace("sub-01", "")
+    pheno.write_text(
+        "\n".join(row.replace('"none"', "none") for row in pheno_rows)
+    )
+    data_dictionary = json.loads((test_data / "example9.json").read_text())
+    data_dictionary["other_tool_item1"]["Annotations"]["MissingValues"] = [
+        "NOT IN TSV"
+    ]
+    dictionary = tmp_path / "dictionary.json"
+    dictionary.write_text(json.dumps(data_dictionary))
+
+    result = runner.invoke(
+        bagel,
+        ["validate", "--pheno", pheno, "--dictionary", dictionary],
+    )
+
+    assert result.exit_code == 1
+    report = json.loads(result.stdout)
+    assert [error["type"] for error in report["errors"]] == [
+        "LookupError",
+        "LookupError",
+    ]
+    assert "'group': ['UNANNOTATED']" in report["errors"][0]["message"]
+    assert "following rows (first row is zero): [0]" in (
+        report["errors"][1]["message"]
+    )
+    assert len(report["warnings"]) == 1
+    assert "'other_tool_item1': ['NOT IN TSV']" in report["warnings"][0]
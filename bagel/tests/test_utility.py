@@ -1,14 +1,28 @@
+import io
+import json
+import shutil
 from collections import Counter
 from contextlib import nullcontext as does_not_raise
+from datetime import timedelta
 from pathlib import Path
 
+import isodate
 import pandas as pd
 import pytest
 from bids import BIDSLayout
 
+import bagel.bench_utils as bench_utils
 import bagel.bids_utils as butil
+import bagel.metrics_utils as mutil
 import bagel.pheno_utils as putil
-from bagel import mappings
+import bagel.rdf_utils as rutil
+from bagel import mappings, models
+from bagel.utility import (
+    CSVEngine,
+    get_shard_bounds,
+    iter_json_fields,
+    write_json_fields,
+)
 
 
 @pytest.fixture
@@ -138,6 +152,39 @@ def test_age_gets_converted(raw_age, expected_age, heuristic):
     assert expected_age == putil.transform_age(raw_age, heuristic)
 
 
+@pytest.mark.parametrize(
+    "raw_age",
+    [
+        "P20Y6M",
+        "20Y8M",
+        "P25Y",
+        "8M",
+        "P20Y6M15D",
+        "P0.5Y",
+        "P1Y2M3DT4H",
+        "5D",
+        "P2W",
+    ],
+)
+def test_iso8601_age_parsing_matches_isodate(raw_age):
+    """
+    Test that ISO 8601 ages are converted the same way as with isodate, including forms that fall back
+    to isodate, and that durations for which isodate returns a timedelta (i.e. without years or months)
+    are rejected as untransformable.
+    """
+    duration = isodate.parse_duration(
+        raw_age if raw_age.startswith("P") else "P" + raw_age
+    )
+    if isinstance(duration, timedelta):
+        with pytest.raises(ValueError, match="problem with applying"):
+            putil.transform_age(raw_age, "bg:iso8601")
+        return
+
+    assert putil.parse_iso8601_age(raw_age) == float(
+        duration.years + duration.months / 12
+    )
+
+
 @pytest.mark.parametrize(
     "raw_age, incorrect_heuristic",
     [
@@ -170,7 +217,17 @@ def test_invalid_age_heuristic():
     "model, attributes",
     [
         ("Bagel", ["identifier"]),
-        ("Acquisition", ["hasContrastType", "schemaKey"]),
+        (
+            "Acquisition",
+            [
+                "hasContrastType",
+                "numberOfRuns",
+                "repetitionTime",
+                "echoTime",
+                "magneticFieldStrength",
+                "schemaKey",
+            ],
+        ),
         ("Session", ["label", "filePath", "hasAcquisition", "schemaKey"]),
         (
             "Subject",
@@ -258,6 +315,34 @@ def test_create_acquisitions(bids_path, bids_dir, acquisitions, bids_session):
         assert image_counts[contrast] == count
 
 
+@pytest.mark.parametrize(
+    "count_runs, expected_runs",
+    [
+        (False, {"nidm:T1Weighted": None, "nidm:FlowWeighted": None}),
+        (True, {"nidm:T1Weighted": 1, "nidm:FlowWeighted": 3}),
+    ],
+)
+def test_create_aggregated_acquisitions(
+    bids_synthetic, count_runs, expected_runs
+):
+    """
+    Given a BIDS dataset, creates one acquisition per contrast type when aggregating,
+    with the number of image files of that contrast type if requested.
+    """
+    image_list = butil.create_acquisitions(
+        layout=BIDSLayout(bids_synthetic, validate=True),
+        bids_sub_id="01",
+        session="01",
+        aggregate=True,
+        count_runs=count_runs,
+    )
+
+    assert {
+        image.hasContrastType.identifier: image.numberOfRuns
+        for image in image_list
+    } == expected_runs
+
+
 @pytest.mark.parametrize(
     "bids_sub_id, session",
     [("01", "01"), ("02", "02"), ("03", "01")],
@@ -298,3 +383,507 @@ def test_get_session_path_when_session_missing(bids_sub_id):
     assert session_path.endswith(f"sub-{bids_sub_id}")
     assert Path(session_path).is_absolute()
     assert Path(session_path).is_dir()
+
+
+def test_index_session_paths_matches_get_session_path(bids_synthetic):
+    """
+    Test that the session path index built in a single pass contains the same paths
+    that get_session_path() returns for each subject and session.
+    """
+    layout = BIDSLayout(bids_synthetic, validate=True)
+    session_paths = butil.index_session_paths(
+        layout=layout, bids_dir=bids_synthetic
+    )
+
+    for bids_sub_id in layout.get_subjects():
+        for session in layout.get_sessions(subject=bids_sub_id):
+            assert session_paths[
+                (bids_sub_id, session)
+            ] == butil.get_session_path(
+                layout=layout,
+                bids_dir=bids_synthetic,
+                bids_sub_id=bids_sub_id,
+                session=session,
+            )
+
+
+def test_index_session_paths_keeps_symlinks_unresolved(
+    bids_synthetic, tmp_path
+):
+    """
+    Test that when symlinks are not resolved, session paths point into the symlinked
+    BIDS directory rather than its target.
+    """
+    bids_link = tmp_path / "synthetic_link"
+    bids_link.symlink_to(bids_synthetic.resolve(), target_is_directory=True)
+
+    session_paths = butil.index_session_paths(
+        layout=BIDSLayout(bids_link, validate=True),
+        bids_dir=bids_link,
+        resolve_symlinks=False,
+    )
+
+    assert (
+        session_paths[("01", "01")]
+        == (bids_link / "sub-01" / "ses-01").as_posix()
+    )
+    assert all(
+        Path(path).is_dir() and path.startswith(bids_link.as_posix())
+        for path in session_paths.values()
+    )
+
+
+def test_get_session_path_keeps_symlinks_unresolved(bids_synthetic, tmp_path):
+    """
+    Test that when symlinks are not resolved, a session path that is not in the index
+    points into the symlinked BIDS directory rather than its target.
+    """
+    bids_link = tmp_path / "synthetic_link"
+    bids_link.symlink_to(bids_synthetic.resolve(), target_is_directory=True)
+
+    session_path = butil.get_session_path(
+        layout=BIDSLayout(bids_link, validate=True),
+        bids_dir=bids_link,
+        bids_sub_id="01",
+        session="01",
+        session_paths={},
+        resolve_symlinks=False,
+    )
+
+    assert session_path == (bids_link / "sub-01" / "ses-01").as_posix()
+    assert Path(session_path).is_dir()
+
+
+def test_bids_fingerprint_changes_with_dataset_contents(
+    bids_synthetic, tmp_path
+):
+    """Test that the dataset fingerprint is stable, and changes when a file is added."""
+    bids_copy = tmp_path / "synthetic"
+    shutil.copytree(bids_synthetic, bids_copy)
+    fingerprint = butil.fingerprint_bids_dir(bids_copy)
+
+    assert fingerprint == butil.fingerprint_bids_dir(bids_copy)
+
+    (
+        bids_copy / "sub-01" / "ses-01" / "anat" / "sub-01_ses-01_T2w.nii"
+    ).touch()
+    assert fingerprint != butil.fingerprint_bids_dir(bids_copy)
+
+
+@pytest.mark.parametrize("bids_dir", ["synthetic", "ds001"])
+def test_minimal_layout_indexes_the_same_images(bids_path, bids_dir):
+    """
+    Test that the minimal layout finds the same subjects, sessions and image files as the full
+    default layout, without indexing any sidecar files or metadata.
+    """
+    full_layout = butil.create_layout(
+        bids_path / bids_dir, minimal_index=False
+    )
+    minimal_layout = butil.create_layout(bids_path / bids_dir)
+
+    assert minimal_layout.get_subjects() == full_layout.get_subjects()
+    assert sorted(minimal_layout.get_sessions()) == sorted(
+        full_layout.get_sessions()
+    )
+    assert minimal_layout.get(
+        extension=[".nii", ".nii.gz"], return_type="filename"
+    ) == full_layout.get(extension=[".nii", ".nii.gz"], return_type="filename")
+    assert not minimal_layout.get(extension=[".json", ".tsv"])
+    assert set(minimal_layout.get_entities()).issubset(
+        butil.MINIMAL_INDEX_ENTITIES
+    )
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 2**20])
+def test_streamed_json_fields_round_trip(
+    test_data, load_test_json, tmp_path, chunk_size
+):
+    """
+    Test that reading a .jsonld file field by field and writing it back out again
+    reproduces the file, regardless of how it is chunked when read.
+    """
+    jsonld = load_test_json(test_data / "example_synthetic.jsonld")
+    output_p = tmp_path / "streamed.jsonld"
+
+    with open(output_p, "w") as f:
+        write_json_fields(
+            f,
+            iter_json_fields(
+                test_data / "example_synthetic.jsonld",
+                stream_key="hasSamples",
+                chunk_size=chunk_size,
+            ),
+        )
+
+    assert output_p.read_text() == json.dumps(jsonld, indent=2)
+
+
+def test_controlled_terms_are_shared_between_subjects(
+    test_data, load_test_json
+):
+    """
+    Test that subjects with the same phenotypic values share the same ControlledTerm instances,
+    which cannot be modified, but that changing the terms of one subject does not affect the others.
+    """
+    data_dict = load_test_json(test_data / "example_synthetic.json")
+    pheno = pd.read_csv(
+        test_data / "example_synthetic.tsv",
+        sep="\t",
+        keep_default_na=False,
+        dtype=str,
+    )
+
+    subjects = putil.create_dataset(
+        data_dict, pheno, name="do not care name"
+    ).hasSamples
+    sex_terms = {}
+    for subject in subjects:
+        sex_terms.setdefault(subject.sex.identifier, subject.sex)
+        assert subject.sex is sex_terms[subject.sex.identifier]
+
+    assessments = [
+        subject.assessment for subject in subjects if subject.assessment
+    ]
+    assert len(assessments) > 1
+    assert all(
+        term is assessments[0][0]
+        for assessment in assessments
+        for term in assessment
+        if term == assessments[0][0]
+    )
+
+    n_assessments = [len(assessment) for assessment in assessments]
+    assessments[0].append(assessments[0][0])
+    assert [len(assessment) for assessment in assessments[1:]] == (
+        n_assessments[1:]
+    )
+    assert [
+        len(subject.assessment)
+        for subject in putil.create_dataset(
+            data_dict, pheno, name="do not care name"
+        ).hasSamples
+        if subject.assessment
+    ] == n_assessments
+    with pytest.raises(TypeError):
+        subjects[0].sex.identifier = "bids:Other"
+
+
+def test_model_to_dict_matches_pydantic_export(
+    test_data, load_test_json, bids_synthetic
+):
+    """
+    Test that the fast model serializer produces the same output as pydantic's
+    .dict(exclude_none=True) for a dataset with phenotypic and imaging data.
+    """
+    jsonld = load_test_json(test_data / "example_synthetic.jsonld")
+    jsonld.pop("@context")
+    dataset = models.Dataset.parse_obj(jsonld)
+    layout = BIDSLayout(bids_synthetic, validate=True)
+    butil.add_sessions_to_dataset(
+        dataset=dataset,
+        layout=layout,
+        session_paths=butil.index_session_paths(
+            layout=layout, bids_dir=bids_synthetic
+        ),
+        aggregate_acquisitions=True,
+        count_runs=True,
+    )
+
+    model_dict = models.model_to_dict(dataset)
+
+    assert model_dict == dataset.dict(exclude_none=True)
+    assert json.dumps(model_dict) == json.dumps(
+        dataset.dict(exclude_none=True)
+    )
+
+
+def test_find_untransformable_age_values(test_data, load_test_json):
+    """Test that age values which do not match the annotated age transformation are found."""
+    data_dict = load_test_json(test_data / "example2.json")
+    pheno = pd.read_csv(
+        test_data / "example2.tsv", sep="\t", keep_default_na=False, dtype=str
+    )
+    age_column = putil.map_categories_to_columns(data_dict)["age"][0]
+
+    assert putil.find_untransformable_age_values(data_dict, pheno) == {}
+
+    pheno.loc[1, age_column] = "20 years"
+    assert putil.find_untransformable_age_values(data_dict, pheno) == {
+        age_column: ["20 years"]
+    }
+
+
+@pytest.mark.parametrize(
+    "n_items, n_shards, shard_size, expected_bounds",
+    [
+        (10, 3, None, [(0, 3), (3, 6), (6, 10)]),
+        (2, 5, None, [(0, 1), (1, 2)]),
+        (10, None, 4, [(0, 4), (4, 8), (8, 10)]),
+        (0, None, 4, [(0, 0)]),
+        (0, 3, None, [(0, 0)]),
+    ],
+)
+def test_get_shard_bounds(n_items, n_shards, shard_size, expected_bounds):
+    """Test that shards cover all items in order, and that no shard is empty unless there are no items."""
+    assert (
+        get_shard_bounds(n_items, n_shards=n_shards, shard_size=shard_size)
+        == expected_bounds
+    )
+
+
+@pytest.mark.parametrize(
+    "term, expected_iri",
+    [
+        ("bg:Subject", "http://neurobagel.org/vocab/Subject"),
+        ("snomed:49049000", "https://identifiers.org/snomedct:49049000"),
+        ("bids:Male", "bids:Male"),
+        ("http://example.org/term", "http://example.org/term"),
+    ],
+)
+def test_expand_iri(term, expected_iri):
+    """Test that only terms with a prefix from the context are expanded."""
+    assert (
+        rutil.expand_iri(term, putil.generate_context()["@context"])
+        == expected_iri
+    )
+
+
+@pytest.mark.parametrize("named_graph", [False, True])
+def test_rdf_statements_are_written_per_line(named_graph):
+    """
+    Test that a dataset is written as one statement per line, with typed literals,
+    that controlled terms shared by subjects are only described once, and that N-Quads
+    statements are in the named graph of the dataset.
+    """
+    dataset = models.Dataset(
+        label="my_dataset",
+        hasSamples=[
+            models.Subject(
+                label=f"sub-0{idx}",
+                age=20.5,
+                sex=models.ControlledTerm(
+                    identifier="bids:Female", schemaKey="Sex"
+                ),
+            )
+            for idx in range(2)
+        ],
+    )
+    dataset_dict = models.model_to_dict(dataset)
+    f = io.StringIO()
+    rutil.RDFWriter(
+        f, putil.generate_context(), named_graph=named_graph
+    ).write_dataset(dataset_dict, iter(dataset_dict["hasSamples"]))
+    statements = f.getvalue().splitlines()
+    dataset_iri = f"<{dataset.identifier.replace('bg:', 'http://neurobagel.org/vocab/')}>"
+
+    assert all(statement.endswith(" .") for statement in statements)
+    assert all(
+        statement.endswith(f" {dataset_iri} .") == named_graph
+        for statement in statements
+    )
+    assert (
+        sum(
+            "<http://neurobagel.org/vocab/hasSamples>" in s for s in statements
+        )
+        == 2
+    )
+    assert sum(s.startswith("<bids:Female> ") for s in statements) == 1
+    assert any(
+        '"20.5"^^<http://www.w3.org/2001/XMLSchema#double>' in s
+        for s in statements
+    )
+    assert any('"my_dataset"' in s for s in statements)
+
+
+def test_merged_pheno_inputs_have_one_row_per_participant():
+    """
+    Test that participants only found in a later phenotypic file are appended, that their
+    missing values are annotated as missing, and that columns found in several files are rejected.
+    """
+    id_annotations = {
+        "Annotations": {"IsAbout": {"TermURL": "bg:ParticipantID"}}
+    }
+    age_annotations = {
+        "Annotations": {
+            "IsAbout": {"TermURL": "bg:Age"},
+            "Transformation": {"TermURL": "bg:float"},
+        }
+    }
+    tool_annotations = {
+        "Annotations": {
+            "IsAbout": {"TermURL": "bg:Assessment"},
+            "IsPartOf": {"TermURL": "cogAtlas:1234"},
+            "MissingValues": ["n/a"],
+        }
+    }
+    first_input = (
+        {"participant_id": id_annotations, "age": age_annotations},
+        pd.DataFrame(
+            {
+                "participant_id": ["sub-02", "sub-02", "sub-01"],
+                "age": ["20", "21", "30"],
+            }
+        ),
+    )
+    second_input = (
+        {"sub": id_annotations, "tool_item": tool_annotations},
+        pd.DataFrame({"sub": ["sub-03", "sub-01"], "tool_item": ["1", "n/a"]}),
+    )
+
+    data_dict, pheno_df = putil.merge_pheno_inputs([first_input, second_input])
+
+    assert pheno_df.to_dict("list") == {
+        "participant_id": ["sub-02", "sub-01", "sub-03"],
+        "age": ["20", "30", ""],
+        "tool_item": ["", "n/a", "1"],
+    }
+    assert data_dict["age"]["Annotations"]["MissingValues"] == [""]
+    assert data_dict["tool_item"]["Annotations"]["MissingValues"] == [
+        "n/a",
+        "",
+    ]
+    assert "MissingValues" not in age_annotations["Annotations"]
+    assert [
+        (subject.label, subject.age)
+        for subject in putil.iter_subjects(data_dict, pheno_df)
+    ] == [("sub-02", 20.0), ("sub-01", 30.0), ("sub-03", None)]
+
+    with pytest.raises(ValueError, match="more than one"):
+        putil.merge_pheno_inputs(
+            [
+                first_input,
+                (
+                    {**second_input[0], "age": age_annotations},
+                    second_input[1].assign(age="1"),
+                ),
+            ]
+        )
+
+
+@pytest.mark.parametrize("engine", list(CSVEngine))
+def test_only_annotated_pheno_columns_are_read(tmp_path, engine):
+    """
+    Test that columns that are not annotated in the data dictionary are skipped, and that
+    the annotated columns are read as categoricals of the values as they are in the file.
+    """
+    if engine == CSVEngine.pyarrow:
+        pytest.importorskip("pyarrow")
+    pheno_p = tmp_path / "pheno.tsv"
+    pheno_p.write_text(
+        "participant_id\tnotes\tage\ttool_item\n"
+        "sub-01\tfirst visit\t007\tNA\n"
+        "sub-02\t\t007\t\n"
+    )
+    data_dict = {
+        column: {"Annotations": {}}
+        for column in ["participant_id", "age", "tool_item", "missing_col"]
+    }
+
+    pheno_df = putil.read_pheno_file(pheno_p, data_dict, engine)
+
+    assert pheno_df.to_dict("list") == {
+        "participant_id": ["sub-01", "sub-02"],
+        "age": ["007", "007"],
+        "tool_item": ["NA", ""],
+    }
+    assert all(
+        isinstance(dtype, pd.CategoricalDtype) for dtype in pheno_df.dtypes
+    )
+
+
+def test_disabled_run_metrics_record_nothing():
+    run_metrics = mutil.RunMetrics("pheno", enabled=False)
+    run_metrics.add("rows_read", 10)
+    with run_metrics.stage("read"):
+        pass
+    assert list(run_metrics.count_items("subjects_built", range(3))) == [
+        0,
+        1,
+        2,
+    ]
+    assert run_metrics.values == {}
+
+
+def test_run_metrics_label_values_are_escaped():
+    run_metrics = mutil.RunMetrics("pheno", enabled=True)
+    run_metrics.labels["dataset"] = 'my "quoted"\\dataset\n'
+    run_metrics.add("rows_read", 10)
+    assert (
+        'bagel_rows_read{command="pheno",dataset="my \\"quoted\\"\\\\dataset\\n"} 10'
+        in run_metrics.to_text().splitlines()
+    )
+
+
+def test_session_checkpoint_ignores_partially_written_records(
+    bids_synthetic, tmp_path
+):
+    """Check that a record written only partially before a run stopped is discarded when the run is resumed."""
+    layout = BIDSLayout(bids_synthetic, validate=True)
+    session_paths = butil.index_session_paths(
+        layout=layout, bids_dir=bids_synthetic
+    )
+    session_checkpoint = butil.SessionCheckpoint(
+        tmp_path / "checkpoint", bids_dir=bids_synthetic, options={}
+    )
+    session_checkpoint.mark_layout_indexed()
+    expected_sessions = session_checkpoint.create_sessions(
+        layout=layout, bids_sub_id="01", session_paths=session_paths
+    )
+    session_checkpoint.save()
+    sessions_p = tmp_path / "checkpoint" / "sessions.jsonl"
+    with open(sessions_p, "a") as f:
+        f.write('{"subject": "02", "sess')
+
+    resumed_checkpoint = butil.SessionCheckpoint(
+        tmp_path / "checkpoint",
+        bids_dir=bids_synthetic,
+        options={},
+        resume=True,
+    )
+    assert resumed_checkpoint.resumed
+    assert resumed_checkpoint.sessions == {"01": expected_sessions}
+    assert sessions_p.read_text().endswith("}\n")
+
+
+def test_sidecar_metadata_matches_pybids_metadata(tmp_path):
+    """
+    Check that the metadata resolved from the sidecars of each image file matches the metadata
+    pybids resolves from its full index, with sidecars at several levels of the dataset.
+    """
+    bids_dir = bench_utils.generate_bids_tree(2, tmp_path)
+    (bids_dir / "T1w.json").write_text(
+        json.dumps({"MagneticFieldStrength": 3, "EchoTime": 0.004})
+    )
+    (bids_dir / "task-rest_bold.json").write_text(
+        json.dumps({"RepetitionTime": 1.5, "MagneticFieldStrength": 3})
+    )
+    (bids_dir / "sub-000001" / "sub-000001_task-rest_bold.json").write_text(
+        json.dumps({"MagneticFieldStrength": 1.5, "EchoTime": 0.03})
+    )
+
+    layout = BIDSLayout(bids_dir, validate=True)
+    resolver = butil.SidecarMetadataResolver(bids_dir)
+    image_files = layout.get(extension=[".nii", ".nii.gz"])
+    assert image_files
+    for image_file in image_files:
+        assert resolver.get_metadata(image_file.path) == layout.get_metadata(
+            image_file.path
+        )
+
+
+@pytest.mark.parametrize(
+    "example", ["example_synthetic", "example2", "example6"]
+)
+def test_pheno_summary_matches_summary_of_created_subjects(test_data, example):
+    """Check that the summary computed from a phenotypic file matches the summary of the subjects created from it."""
+    data_dict, pheno_df = putil.read_pheno_inputs(
+        test_data / f"{example}.tsv", test_data / f"{example}.json"
+    )
+    pheno_summary = putil.summarize_pheno(data_dict, pheno_df)
+    subject_summary = putil.summarize_subject_dicts(
+        putil.iter_subject_dicts(data_dict, pheno_df)
+    )
+
+    assert pheno_summary == {
+        key: subject_summary[key] for key in pheno_summary
+    }
@@ -0,0 +1,195 @@
+import base64
+import http.client
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+from urllib.parse import urlsplit
+
+from bagel.utility import hash_file, load_json
+
+
+def iter_jsonld_batches(jsonld_p: Path, batch_size: int) -> Iterator[tuple]:
+    """
+    Splits the subjects of a .jsonld file created by the pheno or bids commands into batches,
+    and yields a (key, document) pair per batch. Each document is a self-contained JSON-LD document
+    with the @context and the dataset-level fields of the file, and one batch of subjects.
+    The key identifies the batch across runs, and changes if the contents of the file or the batch size
+    change.
+    """
+    file_key = f"{Path(jsonld_p).absolute().as_posix()}#{hash_file(jsonld_p)}"
+    jsonld = load_json(jsonld_p)
+    # Delta outputs of the bids command list their subjects in an @graph instead of a Dataset
+    subjects_key = "hasSamples" if "hasSamples" in jsonld else "@graph"
+    subjects = jsonld.pop(subjects_key)
+
+    for start in range(0, len(subjects), batch_size):
+        end = min(start + batch_size, len(subjects))
+        yield (
+            f"{file_key}#{batch_size}:{start}-{end}",
+            {**jsonld, subjects_key: subjects[start:end]},
+        )
+
+
+class _ConnectionPool:
+    """Keeps one persistent HTTP(S) connection to the endpoint per thread."""
+
+    def __init__(self, url: str, timeout: float):
+        parsed_url = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if parsed_url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.netloc = parsed_url.netloc
+        self.path = (parsed_url.path or "/") + (
+            f"?{parsed_url.query}" if parsed_url.query else ""
+        )
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def get(self) -> http.client.HTTPConnection:
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = self.connection_class(
+                self.netloc, timeout=self.timeout
+            )
+        return self._local.connection
+
+    def reset(self):
+        """Closes the connection of the current thread, so that a new one is opened on the next request."""
+        if getattr(self._local, "connection", None) is not None:
+            self._local.connection.close()
+            self._local.connection = None
+
+
+def _post_with_retries(
+    pool: _ConnectionPool,
+    body: bytes,
+    headers: dict,
+    retries: int,
+    backoff: float,
+):
+    """
+    Sends a POST request to the endpoint, retrying with exponential backoff on connection errors,
+    server errors and rate limiting. Raises a ConnectionError if the request does not succeed.
+    """
+    for attempt in range(retries + 1):
+        try:
+            connection = pool.get()
+            connection.request("POST", pool.path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status < 300:
+                return
+            error = f"HTTP {response.status} {response.reason}"
+            # Client errors other than rate limiting will not succeed when retried
+            if response.status < 500 and response.status != 429:
+                break
+        except (OSError, http.client.HTTPException) as e:
+            pool.reset()
+            error = f"{type(e).__name__}: {e}"
+        if attempt < retries:
+            time.sleep(backoff * 2**attempt)
+
+    raise ConnectionError(
+        f"The upload to the graph endpoint failed ({error})."
+    )
+
+
+def _write_state(state_p: Path, url: str, completed: set):
+    """
+    Writes the url and the keys of the uploaded batches to the state file. The file is replaced
+    in one step, so that an interrupted write does not leave a partial file behind.
+    """
+    state_p = Path(state_p)
+    fd, tmp_p = tempfile.mkstemp(
+        dir=state_p.parent, prefix=f".{state_p.name}."
+    )
+    with os.fdopen(fd, "w") as f:
+        f.write(
+            json.dumps({"url": url, "completed": sorted(completed)}, indent=2)
+        )
+    os.replace(tmp_p, state_p)
+
+
+def upload_jsonld_files(
+    jsonld_paths: list,
+    url: str,
+    batch_size: int,
+    jobs: int,
+    retries: int = 3,
+    backoff: float = 1.0,
+    timeout: float = 60.0,
+    state_p: Optional[Path] = None,
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+) -> dict:
+    """
+    Uploads the subjects of .jsonld files to a graph endpoint in batches, sending up to `jobs` batches
+    concurrently. If a state file is provided, the url and the keys of uploaded batches are recorded
+    in it, and batches already recorded from a previous run to the same url are skipped.
+
+    Returns a report with the number of batches found, uploaded and skipped, and the errors of any
+    batches that failed to upload.
+    """
+    headers = {"Content-Type": "application/ld+json"}
+    if username is not None:
+        credentials = base64.b64encode(
+            f"{username}:{password or ''}".encode()
+        ).decode()
+        headers["Authorization"] = f"Basic {credentials}"
+
+    completed = set()
+    if state_p is not None and state_p.exists():
+        state = load_json(state_p)
+        # Batches uploaded to another endpoint still need to be uploaded to this one
+        if state.get("url") == url:
+            completed = set(state["completed"])
+    state_lock = threading.Lock()
+    pool = _ConnectionPool(url, timeout=timeout)
+
+    def upload_batch(key: str, document: dict) -> Optional[str]:
+        try:
+            _post_with_retries(
+                pool,
+                json.dumps(document).encode(),
+                headers,
+                retries=retries,
+                backoff=backoff,
+            )
+        except ConnectionError as e:
+            return str(e)
+        if state_p is not None:
+            with state_lock:
+                completed.add(key)
+                _write_state(state_p, url, completed)
+        return None
+
+    n_batches = 0
+    n_skipped = 0
+    futures = {}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for jsonld_p in jsonld_paths:
+            for key, document in iter_jsonld_batches(jsonld_p, batch_size):
+                n_batches += 1
+                if key in completed:
+                    n_skipped += 1
+                    continue
+                futures[key] = executor.submit(upload_batch, key, document)
+
+    failed = {
+        key: future.result()
+        for key, future in futures.items()
+        if future.result() is not None
+    }
+
+    return {
+        "n_batches": n_batches,
+        "n_uploaded": len(futures) - len(failed),
+        "n_skipped": n_skipped,
+        "failed": failed,
+    }
@@ -1,8 +1,299 @@
+import gzip
+import hashlib
 import json
+import lzma
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from itertools import repeat
 from pathlib import Path
+from typing import IO, Iterable, Iterator, Optional
+
+_DECODER = json.JSONDecoder()
+
+
+class Compression(str, Enum):
+    none = "none"
+    gz = "gz"
+    xz = "xz"
+
+
+class OutputFormat(str, Enum):
+    jsonld = "jsonld"
+    nt = "nt"
+    nq = "nq"
+
+
+class CSVEngine(str, Enum):
+    c = "c"
+    pyarrow = "pyarrow"
+
+
+_COMPRESSED_OPENERS = {Compression.gz: gzip.open, Compression.xz: lzma.open}
+
+
+def add_compression_suffix(file_p: Path, compression: Compression) -> Path:
+    """Appends the file extension of the compression format (if any) to a file path."""
+    if compression == Compression.none:
+        return file_p
+    return file_p.with_name(f"{file_p.name}.{compression.value}")
+
+
+def open_file(
+    file_p: Path, mode: str = "r", compression: Optional[Compression] = None
+) -> IO[str]:
+    """
+    Opens a text file, which is (de)compressed on the fly with the given compression format.
+    If no compression format is given, it is chosen based on the file extension (.gz or .xz).
+    """
+    if compression is None:
+        compression = {
+            ".gz": Compression.gz,
+            ".xz": Compression.xz,
+        }.get(Path(file_p).suffix, Compression.none)
+    if compression == Compression.none:
+        return open(file_p, mode)
+    return _COMPRESSED_OPENERS[compression](file_p, mode + "t")
 
 
 def load_json(input_p: Path) -> dict:
-    """Load a user-specified json type file."""
-    with open(input_p, "r") as f:
+    """Load a user-specified json type file, which may be compressed."""
+    with open_file(input_p, "r") as f:
         return json.load(f)
+
+
+def hash_file(file_p: Path, chunk_size: int = 2**20) -> str:
+    """Returns the SHA-256 hash of the contents of a file, which is read in chunks."""
+    hasher = hashlib.sha256()
+    with open(file_p, "rb") as f:
+        while chunk := f.read(chunk_size):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def get_bagel_version() -> str:
+    """
+    Returns a version of bagel that changes with any change to its code, namely a hash of its
+    source files. The project does not declare a package version, and an installed one would not
+    change with edits to the code.
+    """
+    hasher = hashlib.sha256()
+    for source_p in sorted(Path(__file__).parent.glob("*.py")):
+        hasher.update(f"{source_p.name}\t{hash_file(source_p)}\n".encode())
+    return f"source-{hasher.hexdigest()[:16]}"
+
+
+class _IncrementalJSONReader:
+    """Decodes consecutive JSON tokens and values from a file object that is read in chunks."""
+
+    def __init__(self, f: IO[str], chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it, or "" at the end of the file."""
+        while True:
+            while (
+                self.pos < len(self.buffer)
+                and self.buffer[self.pos] in " \t\n\r"
+            ):
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill():
+                return self.buffer[self.pos : self.pos + 1]
+
+    def consume(self, expected: str) -> str:
+        """Consumes and returns the next non-whitespace character, which must be one of expected."""
+        char = self.peek()
+        if not char or char not in expected:
+            raise json.JSONDecodeError(
+                f"Expecting one of {expected!r}", self.buffer, self.pos
+            )
+        self.pos += 1
+        return char
+
+    def decode(self):
+        """Decodes the next complete JSON value, reading more of the file as needed."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self) -> Iterator:
+        """Decodes the elements of a JSON array one at a time."""
+        self.consume("[")
+        if self.peek() == "]":
+            self.consume("]")
+            return
+        while True:
+            yield self.decode()
+            if self.consume(",]") == "]":
+                return
+
+
+def iter_json_fields(
+    input_p: Path, stream_key: str, chunk_size: int = 2**20
+) -> Iterator[tuple]:
+    """
+    Incrementally parses a (possibly compressed) file containing a single JSON object and yields
+    its (key, value) pairs in order.
+    The value of stream_key is yielded as an iterator over the elements of the array it contains,
+    which are decoded lazily and must be consumed before the next field is read.
+    """
+    with open_file(input_p, "r") as f:
+        reader = _IncrementalJSONReader(f, chunk_size)
+        reader.consume("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            key = reader.decode()
+            reader.consume(":")
+            if key == stream_key:
+                items = reader.iter_array()
+                yield key, items
+                # Skip any elements the caller did not consume
+                for _ in items:
+                    pass
+            else:
+                yield key, reader.decode()
+            if reader.consume(",}") == "}":
+                return
+
+
+def write_json_fields(f: IO[str], fields: Iterable[tuple]):
+    """
+    Writes (key, value) pairs as a single JSON object, formatted the same way as json.dumps(..., indent=2).
+    Values that are iterators are written as JSON arrays, one element at a time.
+    """
+    f.write("{")
+    field_idx = -1
+    for field_idx, (key, value) in enumerate(fields):
+        f.write(("," if field_idx else "") + f"\n  {json.dumps(key)}: ")
+        if not isinstance(value, Iterator):
+            f.write(json.dumps(value, indent=2).replace("\n", "\n  "))
+            continue
+        f.write("[")
+        item_idx = -1
+        for item_idx, item in enumerate(value):
+            f.write(
+                ("," if item_idx else "")
+                + "\n    "
+                + json.dumps(item, indent=2).replace("\n", "\n    ")
+            )
+        f.write("\n  ]" if item_idx >= 0 else "]")
+    f.write("\n}" if field_idx >= 0 else "}")
+
+
+def get_shard_bounds(
+    n_items: int,
+    n_shards: Optional[int] = None,
+    shard_size: Optional[int] = None,
+) -> list:
+    """
+    Splits a list of n_items into contiguous shards, either into n_shards shards of nearly equal size
+    or into shards of at most shard_size items, and returns the (start, end) indices of each shard.
+    No shard is empty unless there are no items, in which case a single empty shard is returned.
+    """
+    if (n_shards is None) == (shard_size is None):
+        raise ValueError(
+            "Exactly one of the number of shards and the shard size must be provided."
+        )
+    if shard_size is not None:
+        starts = list(range(0, n_items, shard_size))
+        return [
+            (start, min(start + shard_size, n_items)) for start in starts
+        ] or [(0, 0)]
+
+    n_shards = max(1, min(n_shards, n_items))
+    return [
+        (n_items * idx // n_shards, n_items * (idx + 1) // n_shards)
+        for idx in range(n_shards)
+    ]
+
+
+def _write_shard(shard_p: Path, compression: Compression, shard: dict):
+    with open_file(shard_p, "w", compression) as f:
+        f.write(json.dumps(shard, indent=2))
+
+
+def write_jsonld_shards(
+    document: dict,
+    output_p: Path,
+    compression: Compression,
+    n_shards: Optional[int] = None,
+    shard_size: Optional[int] = None,
+    jobs: int = 1,
+) -> dict:
+    """
+    Splits the subjects of a JSON-LD document into shards (see get_shard_bounds()), and writes each
+    shard as a self-contained document with the @context and the dataset-level fields, including the
+    dataset identifier, to a numbered file next to output_p. If jobs is more than 1, the shards are
+    encoded and written in `jobs` worker processes.
+
+    A manifest listing the shard files, relative to the output directory, is written to
+    <output_p stem>_manifest.json and returned.
+    """
+    subjects = document["hasSamples"]
+    dataset_fields = {
+        key: value for key, value in document.items() if key != "hasSamples"
+    }
+    output_stem = Path(output_p).name.split(".")[0]
+    shard_bounds = get_shard_bounds(len(subjects), n_shards, shard_size)
+    shard_paths = [
+        add_compression_suffix(
+            Path(output_p).with_name(f"{output_stem}_{shard_idx:05d}.jsonld"),
+            compression,
+        )
+        for shard_idx in range(len(shard_bounds))
+    ]
+
+    shards = (
+        {**dataset_fields, "hasSamples": subjects[start:end]}
+        for start, end in shard_bounds
+    )
+    if jobs <= 1 or len(shard_paths) == 1:
+        for shard_p, shard in zip(shard_paths, shards):
+            _write_shard(shard_p, compression, shard)
+    else:
+        # Indented JSON is encoded in pure Python, which holds the GIL, so threads would not run in parallel
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(shard_paths))
+        ) as executor:
+            for _ in executor.map(
+                _write_shard, shard_paths, repeat(compression), shards
+            ):
+                pass
+
+    manifest = {
+        "dataset": document.get("identifier"),
+        "n_subjects": len(subjects),
+        "shards": [
+            {"path": shard_p.name, "n_subjects": end - start}
+            for shard_p, (start, end) in zip(shard_paths, shard_bounds)
+        ],
+    }
+    with open(
+        Path(output_p).with_name(f"{output_stem}_manifest.json"), "w"
+    ) as f:
+        f.write(json.dumps(manifest, indent=2))
+
+    return manifest